@@ -1,36 +1,15 @@
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from langchain.prompts import ChatPromptTemplate
-from config import OPENAI_API_KEY,GROQ_API_KEY
-import supabase
+from config import LLM_TEMPERATURE, GENERATION_CACHE_SIZE, GENERATION_CACHE_TTL, BATCH_CONCURRENCY
 from fastapi import HTTPException
-from db import supabase
+from post_writer import get_post_writer
+import asyncio
+from typing import AsyncIterator, List, Optional
+from generation_cache import GenerationCache
+from llm_router import get_router
+from admission import get_admission
+from circuit_breaker import CircuitOpenError
 
-async def generate_post(user_id: str, text: str, length: str, note: str) -> dict:
-    """
-    Generate engaging LinkedIn posts that get results.
-    
-    Args:
-        user_id: User identifier
-        text: Topic or idea for your post
-        length: "short", "medium", or "long" 
-     
-    Returns:
-        Ready-to-post LinkedIn content with proper formatting
-    """
-    
-    # Initialize the AI
-    llm = ChatOpenAI(
-        temperature=0.7,
-        model_name="gpt-4",
-        openai_api_key=OPENAI_API_KEY
-    )
-    
-
-    
-    
-    # Master system prompt - dynamic LinkedIn post generation
-    system_prompt = """
+# Master system prompt - dynamic LinkedIn post generation
+SYSTEM_PROMPT = """
         You are a LinkedIn expert who writes posts that people actually stop to read, engage with, and share.
 
         Your style:
@@ -51,58 +30,317 @@ async def generate_post(user_id: str, text: str, length: str, note: str) -> dict
         - Always generate a ready-to-post LinkedIn text, formatted with proper line breaks.
         """
 
-      
-    length_map = {
-            "short": "under 200 words - quick and punchy",
-            "medium": "200-300 words - balanced depth",
-            "long": "300-500 words - detailed with story"
-        }
+LENGTH_MAP = {
+    "short": "under 200 words - quick and punchy",
+    "medium": "200-300 words - balanced depth",
+    "long": "300-500 words - detailed with story"
+}
 
-        # Dynamic prompt template
-    prompt_template = f"""
-        {system_prompt}
+
+def build_prompt(text: str, length: str, note: str) -> str:
+    """Dynamic prompt for a single LinkedIn post."""
+    return f"""
+        {SYSTEM_PROMPT}
 
         Topic: {text}
         Desired structure and end goal: {note}
-        Length: {length_map[length]}
+        Length: {LENGTH_MAP[length]}
 
         Output:
         A compelling LinkedIn post that adapts dynamically to the given structure and goal. 
         Make it engaging, conversational, and easy to read with proper paragraph breaks.
         """
 
-    try:
-        response = await llm.ainvoke(prompt_template)
-        
-        generated_text=response.content.strip().replace('"', '')
-        return  {
-            "generated_text":generated_text,
-            "status":"success"
-        }
+
+# Revisions send only this and the draft, not SYSTEM_PROMPT, and go to the cheaper "revise" model tier
+REVISE_PROMPT = """Revise this LinkedIn post: {instruction}
+
+Change only what that asks for. Keep the author's voice, the line breaks, no emojis and no hashtags.
+Reply with the revised post only.
+
+{text}"""
+
+
+def build_revise_prompt(text: str, instruction: str) -> str:
+    """Compact edit prompt for an existing draft."""
+    return REVISE_PROMPT.format(instruction=instruction, text=text)
+
+
+# Recent generations, keyed on the normalized request plus model settings
+generation_cache = GenerationCache(maxsize=GENERATION_CACHE_SIZE, ttl=GENERATION_CACHE_TTL)
+
+
+def clean_generated_text(text: str) -> str:
+    return text.strip().replace('"', '')
+
+
+async def generate_post(user_id: str, text: str, length: str, note: str, fresh: bool = False) -> dict:
+    """
+    Generate engaging LinkedIn posts that get results.
     
-    except Exception as e:
-       return {
-            "error": str(e),
-            "status": "failed"
+    Args:
+        user_id: User identifier
+        text: Topic or idea for your post
+        length: "short", "medium", or "long" 
+        fresh: Skip the cache and always ask the LLM for a new variant
+     
+    Returns:
+        Ready-to-post LinkedIn content with proper formatting
+    """
+    key = GenerationCache.make_key(
+        user_id=user_id, text=text, length=length, note=note,
+        model=get_router().model_tag(), temperature=LLM_TEMPERATURE
+    )
+    result = await generation_cache.get_or_generate(
+        key,
+        lambda: _generate(build_prompt(text, length, note)),
+        fresh=fresh,
+        should_cache=lambda r: r.get("status") == "success"
+    )
+    return dict(result)
+
+
+async def generate_and_store_post(user_id: str, text: str, length: str, note: str, fresh: bool = False) -> dict:
+    """
+    generate_post, then store the post. Repeating a request (e.g. a
+    double-click) returns the post already stored for it, while it is
+    cached, instead of storing a duplicate draft.
+
+    Returns:
+        The stored post (post_id, generated_text), or a failed result with the error
+    """
+    key = GenerationCache.make_key(
+        stored=True, user_id=user_id, text=text, length=length, note=note,
+        model=get_router().model_tag(), temperature=LLM_TEMPERATURE
+    )
+
+    async def generate_and_store() -> dict:
+        result = await generate_post(user_id=user_id, text=text, length=length, note=note, fresh=fresh)
+        if result.get("status") != "success":
+            return result
+        stored_post = await store_generated_post(
+            user_id=user_id,
+            generated_text=result["generated_text"],
+            original_text=text,
+            length=length,
+            note=note
+        )
+        return {
+            "post_id": stored_post["id"],
+            "generated_text": result["generated_text"],
+            "status": "success"
         }
 
+    # The stored row is cached with the text, so a repeat points at the same row
+    result = await generation_cache.get_or_generate(
+        key,
+        generate_and_store,
+        fresh=fresh,
+        should_cache=lambda r: r.get("status") == "success"
+    )
+    return dict(result)
+
+
+async def _generate(prompt_template: str, tier: str = "default") -> dict:
+    router = get_router(tier)
+
+    # Fail fast (CircuitOpenError) rather than queue while every provider is down
+    router.check()
+    # Raises AdmissionRejected if no generation slot frees up in time
+    async with get_admission().slot():
+        try:
+            # Routed to the fastest healthy provider
+            response = await router.ainvoke(prompt_template)
+
+            generated_text=clean_generated_text(response.content)
+            return  {
+                "generated_text":generated_text,
+                "status":"success"
+            }
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+           return {
+                "error": str(e),
+                "status": "failed"
+            }
+
+
+# The columns of the draft that revise_post reads
+REVISE_COLUMNS = "id, user_id, generated_text, original_text, length, note, version"
+
+
+async def revise_post(post: dict, instruction: str, fresh: bool = False) -> dict:
+    """
+    Revise a stored draft with a short edit instruction, e.g. "shorter" or
+    "stronger hook".
+
+    Only the instruction and the draft are sent, to the cheaper "revise"
+    model tier with capped output. The revision is stored as a new
+    `generated_posts` row whose parent_id is the draft's id and whose version
+    is one more than the draft's, so revisions of the same draft share it.
+
+    Repeating an instruction on the same draft returns the revision already
+    stored for it (while it is cached) instead of storing another row.
+
+    Args:
+        fresh: Always ask the LLM for a new revision and store it
+
+    Returns:
+        The stored revision (post_id, parent_id, version, generated_text),
+        or a failed result with the error
+    """
+    key = GenerationCache.make_key(
+        revise=post["id"], text=post["generated_text"], instruction=instruction,
+        model=get_router("revise").model_tag(), temperature=LLM_TEMPERATURE
+    )
+
+    async def revise_and_store() -> dict:
+        result = await _generate(build_revise_prompt(post["generated_text"], instruction), tier="revise")
+        if result.get("status") != "success":
+            return result
+        version = (post.get("version") or 1) + 1
+        stored_post = await store_generated_post(
+            user_id=post["user_id"],
+            generated_text=result["generated_text"],
+            original_text=post.get("original_text"),
+            length=post.get("length"),
+            note=post.get("note"),
+            parent_id=post["id"],
+            version=version,
+            instruction=instruction
+        )
+        return {
+            "post_id": stored_post["id"],
+            "parent_id": post["id"],
+            "version": version,
+            "generated_text": result["generated_text"],
+            "status": "success"
+        }
+
+    # The stored row is cached with the text, so a repeat points at the same row
+    result = await generation_cache.get_or_generate(
+        key,
+        revise_and_store,
+        fresh=fresh,
+        should_cache=lambda r: r.get("status") == "success"
+    )
+    return dict(result)
+
+
+async def stream_post(user_id: str, text: str, length: str, note: str) -> AsyncIterator[str]:
+    """
+    Same as generate_post, but yields the post piece by piece as the LLM
+    produces it. Errors are raised to the caller, who must already hold a
+    generation slot (see admission.py).
+    """
+    prompt_template = build_prompt(text, length, note)
+
+    async for chunk in get_router().astream(prompt_template):
+        if chunk.content:
+            yield chunk.content
+
+
+def post_row(
+    user_id: str,
+    generated_text: str,
+    original_text: str,
+    length: str,
+    note: str,
+    parent_id: Optional[str] = None,
+    version: int = 1,
+    instruction: Optional[str] = None
+) -> dict:
+    """
+    A generated_posts row. Every row carries the same columns, so rows of
+    new posts and revisions can share one bulk insert.
+    """
+    return {
+        "user_id": user_id,
+        "generated_text": generated_text,
+        "original_text": original_text,
+        "length": length,
+        "note": note,
+        # Set for a revision of an earlier version of the post
+        "parent_id": parent_id,
+        "version": version,
+        "instruction": instruction
+    }
+
 
 async def store_generated_post(
     user_id: str, 
     generated_text: str, 
     original_text: str,
     length: str,
-    note: str
+    note: str,
+    parent_id: Optional[str] = None,
+    version: int = 1,
+    instruction: Optional[str] = None
 ) -> dict:
+    row = post_row(user_id, generated_text, original_text, length, note, parent_id, version, instruction)
+    try:
+        return await get_post_writer().add(row)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store post: {str(e)}")
+
+
+async def generate_posts_batch(user_id: str, items: List[dict], variants: int = 1) -> List[dict]:
+    """
+    Generate `variants` posts for each item concurrently and store them all
+    with one bulk insert.
+
+    Args:
+        user_id: User identifier
+        items: Dicts with "text", "length" and "note", as for generate_post
+        variants: Number of distinct posts per item
+
+    Returns:
+        One result per (item, variant) in request order. Each result is either
+        successful (with post_id and generated_text) or failed (with error),
+        independently of the others.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def generate(item: dict, variant: int) -> dict:
+        async with semaphore:
+            # Every variant after the first must be a new generation
+            return await generate_post(
+                user_id=user_id, text=item["text"], length=item["length"],
+                note=item["note"], fresh=variant > 0
+            )
+
+    jobs = [(index, variant) for index in range(len(items)) for variant in range(variants)]
+    generated = await asyncio.gather(
+        *(generate(items[index], variant) for index, variant in jobs),
+        return_exceptions=True
+    )
+
+    results = []
+    rows = []
+    for (index, variant), outcome in zip(jobs, generated):
+        result = {"item": index, "variant": variant}
+        if isinstance(outcome, BaseException):
+            result.update(status="failed", error=str(outcome))
+        elif outcome.get("status") != "success":
+            result.update(status="failed", error=outcome.get("error", "Generation failed"))
+        else:
+            item = items[index]
+            result.update(status="success", generated_text=outcome["generated_text"])
+            rows.append((result, post_row(
+                user_id, outcome["generated_text"], item["text"], item["length"], item["note"]
+            )))
+        results.append(result)
+
     try:
-        response = supabase.table("generated_posts").insert({
-            "user_id": user_id,
-            "generated_text": generated_text,
-            "original_text": original_text,
-            "length": length,
-            "note": note
-        }).execute()
-        
-        return response.data[0]
+        stored = await get_post_writer().add_many([row for _, row in rows])
+        for (result, _), stored_post in zip(rows, stored):
+            result["post_id"] = stored_post["id"]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to store post: {str(e)}")
\ No newline at end of file
+        for result, _ in rows:
+            result.update(status="failed", error=f"Failed to store post: {str(e)}")
+
+    return results
@@ -0,0 +1,221 @@
+"""Admission control for LLM generation.
+
+At most LLM_CONCURRENCY generations run at once and up to LLM_QUEUE_SIZE
+more wait for a slot in arrival order. A request is turned away with
+AdmissionRejected (served as 503 with Retry-After) instead of being queued
+when the queue is full, or when its expected wait plus the expected
+generation time would overrun its deadline. A queued request also gives up
+after LLM_QUEUE_TIMEOUT seconds, or as soon as it could no longer finish in
+time. Expected times come from a moving average of recent generations, so
+when a provider slows down, load is shed up front rather than piling up
+until clients time out and the work is wasted.
+
+Callers that are cancelled while queued (e.g. because the client
+disconnected, see `cancel_on_disconnect`) leave the queue at once.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+from fastapi import HTTPException, Request
+from metrics import gauge, span
+from config import LLM_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT, LLM_REQUEST_DEADLINE
+
+
+class AdmissionRejected(Exception):
+    """Raised when a generation can't get a slot in time; `retry_after` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Too many generations in progress ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int,
+        max_wait: float,
+        deadline: float,
+        smoothing: float = 0.2,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.deadline = deadline
+        self.smoothing = smoothing
+        self._clock = clock
+        self.active = 0
+        self._waiters: deque = deque()
+        # Moving average of how long an admitted generation holds its slot
+        self.service_time: Optional[float] = None
+        self._waits = deque(maxlen=200)
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "timeout": 0}
+        self.abandoned = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the caller at `position` in the queue (1-based) gets a slot."""
+        if self.service_time is None:
+            return 0.0
+        # Slots free up at `limit / service_time` per second
+        return position * self.service_time / self.limit
+
+    def _reject(self, reason: str, wait: float) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        return AdmissionRejected(reason, max(1, math.ceil(wait)))
+
+    async def acquire(self, deadline: Optional[float] = None) -> float:
+        """
+        Wait for a slot and take it. Returns the time spent waiting.
+
+        `deadline` is the clock time the whole generation should be done by
+        (default: LLM_REQUEST_DEADLINE from now). Raises AdmissionRejected
+        when that is out of reach or the queue is full.
+        """
+        start = self._clock()
+        if deadline is None:
+            deadline = start + self.deadline
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return 0.0
+
+        service = self.service_time or 0.0
+        wait = self.expected_wait(len(self._waiters) + 1)
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full", wait)
+        if wait > self.max_wait or start + wait + service > deadline:
+            raise self._reject("deadline", wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        timeout = max(0.0, min(self.max_wait, deadline - start - service))
+        try:
+            with span("llm_admission_wait"):
+                done, _ = await asyncio.wait({waiter}, timeout=timeout)
+        except asyncio.CancelledError:
+            self.abandoned += 1
+            self._leave(waiter)
+            raise
+        if not done:
+            self._leave(waiter)
+            raise self._reject("timeout", self.expected_wait(len(self._waiters) + 1))
+
+        waited = self._clock() - start
+        self._waits.append(waited)
+        self.admitted += 1
+        return waited
+
+    def _leave(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # The slot was handed over just as the caller gave up; pass it on
+            self._release_slot()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the next caller in line, if any
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def release(self, duration: Optional[float] = None) -> None:
+        """Give back a slot. Pass how long it was held to update the service time estimate."""
+        if duration is not None:
+            if self.service_time is None:
+                self.service_time = duration
+            else:
+                self.service_time += self.smoothing * (duration - self.service_time)
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        """Hold a slot for the enclosed block; see `acquire`."""
+        await self.acquire(deadline)
+        start = self._clock()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.release(self._clock() - start if ok else None)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "service_time": round(self.service_time, 3) if self.service_time is not None else None,
+            "wait_p50": round(waits[len(waits) // 2], 3) if waits else None,
+            "wait_p95": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 3) if waits else None,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "abandoned": self.abandoned,
+        }
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable):
+    """
+    Await `awaitable`, cancelling it if the client disconnects first.
+
+    Starlette keeps running a handler after its client has gone away, so a
+    slow generation would otherwise hold its slot and LLM call for nobody.
+    """
+    task = asyncio.ensure_future(awaitable)
+
+    async def disconnected():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task not in done:
+        task.cancel()
+        # 499 (nginx's "client closed request"); nobody is there to read it
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(
+            LLM_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT, LLM_REQUEST_DEADLINE
+        )
+    return _admission
+
+
+def set_admission(admission: AdmissionController) -> None:
+    """Swap the controller, e.g. for one with other limits in benchmarks."""
+    global _admission
+    _admission = admission
+
+
+gauge("linkfluence_llm_generations_active", "LLM generations holding a slot.", lambda: get_admission().active)
+gauge("linkfluence_llm_generations_queued", "LLM generations waiting for a slot.", lambda: get_admission().queued)
@@ -0,0 +1,35 @@
+from typing import Optional
+from config import ASSET_CACHE_SIZE, ASSET_CACHE_TTL
+from shared_state import SharedCache
+
+
+class AssetCache(SharedCache):
+    """
+    Content-addressed cache of uploaded LinkedIn image assets.
+
+    Maps (owner, sha256 of the image bytes) to the asset URN LinkedIn returned
+    for it, so posting the same image again reuses the asset instead of
+    registering and uploading it a second time. Entries expire after
+    ASSET_CACHE_TTL, which should not exceed how long LinkedIn keeps assets.
+    Entries live in the shared state store (see shared_state.py).
+
+    `invalidate(owner, digest)` drops an entry.
+    """
+
+    namespace = "asset"
+
+    async def get(self, owner: str, digest: str) -> Optional[str]:
+        return await self._lookup(owner, digest)
+
+    async def put(self, owner: str, digest: str, asset: str) -> None:
+        await self._cache.set(self._key(owner, digest), asset)
+
+
+_asset_cache: Optional[AssetCache] = None
+
+
+def get_asset_cache() -> AssetCache:
+    global _asset_cache
+    if _asset_cache is None:
+        _asset_cache = AssetCache(maxsize=ASSET_CACHE_SIZE, ttl=ASSET_CACHE_TTL)
+    return _asset_cache
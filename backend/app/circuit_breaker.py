@@ -0,0 +1,191 @@
+"""Circuit breakers for outbound dependencies.
+
+A breaker keeps the outcome of the last CIRCUIT_WINDOW calls to one
+dependency (LinkedIn, Supabase, an LLM provider). Once at least
+CIRCUIT_MIN_CALLS have been seen and the share of failed calls reaches
+CIRCUIT_ERROR_RATE, or the share of calls slower than the dependency's
+slow-call threshold reaches CIRCUIT_SLOW_CALL_RATE, the breaker opens.
+While open, calls fail at once with CircuitOpenError (served as 503) rather
+than each one waiting out the timeout of a dependency that is down. After
+CIRCUIT_OPEN_SECONDS it goes half-open and lets CIRCUIT_HALF_OPEN_CALLS
+trial calls through: if they all succeed it closes, and any failure opens
+it again.
+
+Breaker states are reported by /health.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import (
+    CIRCUIT_ERROR_RATE, CIRCUIT_SLOW_CALL_RATE, CIRCUIT_WINDOW,
+    CIRCUIT_MIN_CALLS, CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_CALLS,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open; `retry_after` is in seconds."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} is unavailable, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        slow_call: float,
+        error_rate: float = CIRCUIT_ERROR_RATE,
+        slow_call_rate: float = CIRCUIT_SLOW_CALL_RATE,
+        window: int = CIRCUIT_WINDOW,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        open_for: float = CIRCUIT_OPEN_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.slow_call = slow_call
+        self.error_rate = error_rate
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.open_for = open_for
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        # (failed, slow) per call, closed state only
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_for:
+            self._state = HALF_OPEN
+            self._trials = 0
+            self._trial_successes = 0
+        return self._state
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.opened += 1
+        print(f"Circuit breaker {self.name} opened for {self.open_for}s")
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._opened_at + self.open_for - self._clock()))
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if a call would be rejected now, without starting one."""
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._trials >= self.half_open_calls):
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError. Returns whether it is a half-open trial."""
+        self.check()
+        if self._state == HALF_OPEN:
+            self._trials += 1
+            return True
+        return False
+
+    def record(self, duration: float, ok: bool, trial: bool = False) -> None:
+        slow = duration > self.slow_call
+        if trial:
+            self._trials -= 1
+            if self._state != HALF_OPEN:
+                return
+            if not ok or slow:
+                self._open()
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_calls:
+                print(f"Circuit breaker {self.name} closed")
+                self._state = CLOSED
+            return
+
+        # Calls started before the breaker opened say nothing about the trials
+        if self._state != CLOSED:
+            return
+        self._outcomes.append((not ok, slow))
+        if len(self._outcomes) < self.min_calls:
+            return
+        calls = len(self._outcomes)
+        failures = sum(failed for failed, _ in self._outcomes)
+        slow_calls = sum(slow for _, slow in self._outcomes)
+        if failures / calls >= self.error_rate or slow_calls / calls >= self.slow_call_rate:
+            self._open()
+
+    def abandon(self, trial: bool = False) -> None:
+        """A cancelled call, which says nothing about the dependency."""
+        if trial:
+            self._trials -= 1
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        is_failure: Optional[Callable[[Any], bool]] = None,
+        ignore_error: Optional[Callable[[Exception], bool]] = None
+    ) -> Any:
+        """
+        Await `fn()` through the breaker. Exceptions count as failures, and so
+        do results for which `is_failure` returns True (e.g. 5xx responses).
+
+        Exceptions for which `ignore_error` returns True (e.g. a 4xx for a
+        malformed request) are still raised, but count as successful calls:
+        the dependency answered, the request was at fault.
+        """
+        trial = self.before_call()
+        start = self._clock()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.abandon(trial)
+            raise
+        except Exception as e:
+            ok = bool(ignore_error and ignore_error(e))
+            self.record(self._clock() - start, ok, trial)
+            raise
+        self.record(self._clock() - start, not (is_failure and is_failure(result)), trial)
+        return result
+
+    def stats(self) -> dict:
+        calls = len(self._outcomes)
+        stats = {
+            "state": self.state,
+            "calls": calls,
+            "error_rate": round(sum(f for f, _ in self._outcomes) / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(sum(s for _, s in self._outcomes) / calls, 4) if calls else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+        if stats["state"] == OPEN:
+            stats["retry_after"] = self.retry_after()
+        return stats
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, slow_call: float) -> CircuitBreaker:
+    """The shared breaker for dependency `name`, created on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, slow_call)
+    return breaker
+
+
+def breakers() -> Dict[str, CircuitBreaker]:
+    return dict(_breakers)
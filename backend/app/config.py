@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,3 +12,127 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+LINKEDIN_API_BASE = os.getenv("LINKEDIN_API_BASE", "https://api.linkedin.com")
+LINKEDIN_OAUTH_BASE = os.getenv("LINKEDIN_OAUTH_BASE", "https://www.linkedin.com/oauth/v2")
+
+# Shared outbound HTTP client, sized for 50+ concurrent publishes. Keep the keepalive
+# limit equal to the connection limit: httpcore closes idle connections as soon as
+# the pool holds more than the keepalive limit, which defeats reuse under load.
+# The connections are split between HTTP_POOL_SHARDS smaller pools (see http_client.py)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "100"))
+HTTP_POOL_SHARDS = int(os.getenv("HTTP_POOL_SHARDS", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "false").lower() == "true"
+
+# Maximum number of images registered/uploaded to LinkedIn at the same time per post
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "4"))
+
+# Chunk size used when streaming image bodies to LinkedIn's upload URL
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+# LLM generation
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+
+# Cheaper, faster models for revising an existing draft, and their cap on output tokens
+OPENAI_REVISE_MODEL = os.getenv("OPENAI_REVISE_MODEL", "gpt-4o-mini")
+GROQ_REVISE_MODEL = os.getenv("GROQ_REVISE_MODEL", "llama-3.1-8b-instant")
+GEMINI_REVISE_MODEL = os.getenv("GEMINI_REVISE_MODEL", "gemini-1.5-flash-8b")
+LLM_REVISE_MAX_TOKENS = int(os.getenv("LLM_REVISE_MAX_TOKENS", "800"))
+
+# Providers the router may use, in preference order (only those with an API key are enabled)
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "openai,groq,gemini").split(",") if p.strip()]
+# Start a second provider if the first hasn't answered after this many seconds (unset = no hedging)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER")) if os.getenv("LLM_HEDGE_AFTER") else None
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.5"))
+
+# Generation result cache (entries, seconds)
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "1024"))
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "600"))
+
+# Batch generation: concurrent LLM calls per batch request, and request size limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_MAX_VARIANTS = int(os.getenv("BATCH_MAX_VARIANTS", "5"))
+
+# Background publishing: worker tasks, and where queued images are kept until published
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "4"))
+PUBLISH_SPOOL_DIR = os.getenv("PUBLISH_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "linkfluence-publish"))
+# Seconds shutdown waits for jobs in flight to finish before interrupting them
+PUBLISH_DRAIN_TIMEOUT = float(os.getenv("PUBLISH_DRAIN_TIMEOUT", "20"))
+
+# Scheduled publishing: how far ahead (seconds) due posts are loaded into memory, and the page size per load
+SCHEDULER_HORIZON = float(os.getenv("SCHEDULER_HORIZON", "300"))
+SCHEDULER_LOAD_LIMIT = int(os.getenv("SCHEDULER_LOAD_LIMIT", "1000"))
+# With several server workers, seconds between reads of that window for posts scheduled through other workers
+SCHEDULER_REFRESH = float(os.getenv("SCHEDULER_REFRESH", "30"))
+
+# Client-side LinkedIn throttling (requests per second and burst size), per application and per member token
+LINKEDIN_APP_RATE = float(os.getenv("LINKEDIN_APP_RATE", "20"))
+LINKEDIN_APP_BURST = float(os.getenv("LINKEDIN_APP_BURST", "40"))
+LINKEDIN_MEMBER_RATE = float(os.getenv("LINKEDIN_MEMBER_RATE", "5"))
+LINKEDIN_MEMBER_BURST = float(os.getenv("LINKEDIN_MEMBER_BURST", "10"))
+# How many 429 responses in a row a call waits out before giving up
+LINKEDIN_THROTTLE_RETRIES = int(os.getenv("LINKEDIN_THROTTLE_RETRIES", "5"))
+
+# Access tokens cached in-process per LinkedIn id (entries, seconds)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "900"))
+
+# Uploaded LinkedIn image assets reused for identical images (entries, seconds)
+ASSET_CACHE_SIZE = int(os.getenv("ASSET_CACHE_SIZE", "10000"))
+ASSET_CACHE_TTL = float(os.getenv("ASSET_CACHE_TTL", str(24 * 3600)))
+
+# Optional image preprocessing before upload: downsize, strip EXIF and re-encode in a process
+# pool (needs Pillow). Off by default, since re-encoding is lossy
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "false").lower() == "true"
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1920"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Admission control for LLM generation: concurrent calls, callers allowed to wait for one,
+# the longest wait (seconds), and the time a generation request may take end to end (seconds)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "30"))
+
+# Circuit breakers per dependency (LinkedIn, Supabase, each LLM provider). A breaker opens when, over the last
+# CIRCUIT_WINDOW calls (at least CIRCUIT_MIN_CALLS), the share of failed calls or of calls slower than the
+# dependency's slow-call threshold (seconds) reaches its rate. It then fails fast for CIRCUIT_OPEN_SECONDS
+# before letting CIRCUIT_HALF_OPEN_CALLS trial calls through.
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_SLOW_CALL_RATE = float(os.getenv("CIRCUIT_SLOW_CALL_RATE", "0.8"))
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "3"))
+LINKEDIN_SLOW_CALL = float(os.getenv("LINKEDIN_SLOW_CALL", "15"))
+SUPABASE_SLOW_CALL = float(os.getenv("SUPABASE_SLOW_CALL", "2"))
+LLM_SLOW_CALL = float(os.getenv("LLM_SLOW_CALL", "30"))
+
+# Write-behind for generated posts: rows per bulk insert, seconds a row may wait for its batch,
+# and rows buffered (pending or being written) before new generations wait for room
+POST_WRITE_BATCH = int(os.getenv("POST_WRITE_BATCH", "100"))
+POST_WRITE_INTERVAL = float(os.getenv("POST_WRITE_INTERVAL", "0.05"))
+POST_WRITE_MAX_PENDING = int(os.getenv("POST_WRITE_MAX_PENDING", "1000"))
+# Tries per batch on transient database errors before its rows are dropped, and the seconds
+# a read waits for a buffered post to be written before answering 503
+POST_WRITE_ATTEMPTS = int(os.getenv("POST_WRITE_ATTEMPTS", "8"))
+POST_WRITE_WAIT_TIMEOUT = float(os.getenv("POST_WRITE_WAIT_TIMEOUT", "10"))
+
+# Production server (server.py): worker processes, and the address they share
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "4000"))
+
+# Where caches and LinkedIn rate limits live: "memory://" keeps them in each worker process,
+# "redis://host:6379/0" shares them between workers through a Redis-compatible server
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "linkfluence:")
+# Seconds a Redis call may take; after that it counts as failed and caches act as empty
+SHARED_STATE_TIMEOUT = float(os.getenv("SHARED_STATE_TIMEOUT", "1"))
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict
+from shared_state import get_shared_state
+
+
+class GenerationCache:
+    """
+    LRU + TTL cache for LLM generations with single-flight coalescing.
+
+    Identical requests that arrive while a generation is still running share
+    that one in-flight call instead of starting their own. The call is
+    cancelled once every caller waiting for it has been cancelled.
+
+    Results live in the shared state store (see shared_state.py), so with a
+    shared backend one worker's generation is a hit in the others. Coalescing
+    of in-flight calls stays within the process.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic, state=None):
+        self._cache = (state or get_shared_state()).store("generation", maxsize, ttl, timer)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        # Callers currently awaiting each running call
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(**inputs: Any) -> str:
+        """Stable key over the inputs, with string whitespace normalized."""
+        normalized = {
+            name: " ".join(value.split()) if isinstance(value, str) else value
+            for name, value in inputs.items()
+        }
+        payload = json.dumps(normalized, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get_or_generate(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable[Any]],
+        fresh: bool = False,
+        should_cache: Callable[[Any], bool] = lambda result: True
+    ) -> Any:
+        """
+        Return the cached result for `key`, or run `producer` to create it.
+
+        With `fresh=True` the cache and any in-flight call are skipped. The new
+        result still replaces the cached one.
+        """
+        if not fresh:
+            cached = await self._cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                self.coalesced += 1
+                return await self._join(in_flight)
+
+        self.misses += 1
+
+        async def produce() -> Any:
+            result = await producer()
+            if should_cache(result):
+                await self._cache.set(key, result)
+            return result
+
+        task = asyncio.ensure_future(produce())
+        if not fresh:
+            self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await self._join(task)
+
+    async def _join(self, task: asyncio.Task) -> Any:
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shield so one caller going away doesn't cancel the shared call...
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # ...but the last one to go does, since nobody needs the result
+            if self._waiters[task] == 1:
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieve the exception, so a call nobody waited for doesn't log it as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def invalidate(self, key: str) -> None:
+        await self._cache.delete(key)
+
+    async def clear(self) -> None:
+        await self._cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "size": self._cache.size(),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+            "in_flight": len(self._in_flight),
+        }
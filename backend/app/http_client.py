@@ -0,0 +1,84 @@
+import httpx
+import itertools
+import math
+from typing import Iterator, List, Optional
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_ENABLE_HTTP2,
+    HTTP_POOL_SHARDS,
+)
+
+# The shared connection pool, split between HTTP_POOL_SHARDS clients. httpcore
+# matches every queued request against every pooled connection, so one pool
+# of 100 connections spends more CPU on that than on the requests at 50+
+# concurrent publishes; several small pools keep it cheap.
+_clients: List[httpx.AsyncClient] = []
+_next_client: Optional[Iterator[httpx.AsyncClient]] = None
+
+
+def create_http_client(
+    max_connections: int = HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS
+) -> httpx.AsyncClient:
+    """
+    Build a pooled client for outbound LinkedIn traffic.
+
+    Connections are kept alive between requests so posts and logins reuse
+    the same TCP/TLS sessions instead of handshaking every time.
+    """
+    timeout = httpx.Timeout(30.0, read=60.0)
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=limits,
+        http2=HTTP_ENABLE_HTTP2,
+        verify=True,
+        follow_redirects=True,
+    )
+
+
+def _open_clients() -> None:
+    global _clients, _next_client
+    shards = max(1, HTTP_POOL_SHARDS)
+    _clients = [
+        create_http_client(
+            max_connections=math.ceil(HTTP_MAX_CONNECTIONS / shards),
+            max_keepalive_connections=math.ceil(HTTP_MAX_KEEPALIVE_CONNECTIONS / shards),
+        )
+        for _ in range(shards)
+    ]
+    _next_client = itertools.cycle(_clients)
+
+
+async def open_http_client() -> None:
+    """Create the shared clients. Called once from the app lifespan."""
+    if not _clients or _clients[0].is_closed:
+        _open_clients()
+
+
+async def close_http_client() -> None:
+    """Close the shared clients and release pooled connections."""
+    global _clients, _next_client
+    for client in _clients:
+        await client.aclose()
+    _clients = []
+    _next_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return one of the shared clients, in turn. Callers get it once per
+    publish or login and use it for all of that operation's requests.
+
+    Falls back to creating them on first use so scripts that call the LinkedIn
+    helpers outside the FastAPI app still work.
+    """
+    if not _clients or _clients[0].is_closed:
+        _open_clients()
+    return next(_next_client)
@@ -0,0 +1,88 @@
+"""Shrinking images before they are uploaded to LinkedIn.
+
+Phone photos are often 4000px wide and several MB, while LinkedIn displays
+feed images at no more than IMAGE_MAX_DIMENSION pixels. Each spooled image is
+downsized to that, rotated upright and re-encoded without EXIF (which also
+drops GPS location) at IMAGE_QUALITY. Decoding and encoding are CPU-bound, so
+they run in a process pool and never on the event loop. Only file paths cross
+the process boundary, never the image bytes.
+
+Preprocessing is off unless IMAGE_PREPROCESS=true: it re-encodes uploads
+lossily (PNG without transparency becomes JPEG, large images are resized).
+
+Pillow is optional: without it images are uploaded unchanged.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from config import IMAGE_MAX_DIMENSION, IMAGE_QUALITY, IMAGE_PREPROCESS_WORKERS
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+# Formats that are safe to re-encode; animated GIFs and anything else are left alone
+_SUPPORTED_FORMATS = {"JPEG", "PNG", "WEBP", "MPO"}
+
+
+def shrink_image(path: str, max_dimension: int, quality: int) -> Optional[dict]:
+    """
+    Downsize and re-encode the image at `path` in place.
+
+    Runs in a worker process. Returns the new content type and size, or None
+    if the file was left unchanged (unsupported format, or no smaller and no
+    metadata to strip).
+    """
+    with Image.open(path) as image:
+        if image.format not in _SUPPORTED_FORMATS:
+            return None
+        had_metadata = bool(image.info.get("exif")) or bool(image.getexif())
+        # Apply the EXIF orientation before the tag is dropped
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        target = f"{path}.shrunk"
+        if has_alpha:
+            content_type = "image/png"
+            image.save(target, format="PNG", optimize=True)
+        else:
+            content_type = "image/jpeg"
+            image.convert("RGB").save(target, format="JPEG", quality=quality, optimize=True, progressive=True)
+
+    size = os.path.getsize(target)
+    if size >= os.path.getsize(path) and not had_metadata:
+        os.remove(target)
+        return None
+    os.replace(target, path)
+    return {"content_type": content_type, "size": size}
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def preprocessing_available() -> bool:
+    return Image is not None
+
+
+async def preprocess_image(path: str) -> Optional[dict]:
+    """Shrink the image at `path` in the process pool. See `shrink_image`."""
+    global _pool
+    if _pool is None:
+        # Not forked from the server process, which has threads (the threadpool) and the
+        # listening socket and event loop fds; forking it can deadlock the children
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS, mp_context=multiprocessing.get_context(method))
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, shrink_image, path, IMAGE_MAX_DIMENSION, IMAGE_QUALITY)
+
+
+def close_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,10 +1,260 @@
 import asyncio
+import hashlib
+import os
 import httpx
-from db import supabase
+from config import LINKEDIN_API_BASE, IMAGE_UPLOAD_CONCURRENCY, UPLOAD_CHUNK_SIZE, LINKEDIN_SLOW_CALL
+from http_client import get_http_client
+from rate_limiter import get_rate_limiter, RateLimitedError
+from token_cache import get_token_cache
+from asset_cache import get_asset_cache
+from circuit_breaker import CircuitOpenError, get_breaker
+from metrics import span
 from fastapi import UploadFile, File, HTTPException
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 
-async def post_to_linkedin(user_id: str, text: str, image_files: Optional[List[UploadFile]] = None):
+ProgressCallback = Callable[[str, dict], Awaitable[None]]
+
+
+class ImageUploadError(Exception):
+    """Raised when an image cannot be registered or uploaded to LinkedIn."""
+
+
+class LinkedInAuthError(Exception):
+    """Raised when LinkedIn rejects the member's access token (401)."""
+
+
+def _check_authorized(response: httpx.Response) -> None:
+    if response.status_code == 401:
+        raise LinkedInAuthError("LinkedIn rejected the access token. Please log in again.")
+
+
+async def _linkedin_request(
+    access_token: str,
+    send: Callable[[], Awaitable[httpx.Response]],
+    stage: str
+) -> httpx.Response:
+    """
+    A throttled LinkedIn API call (see rate_limiter.py) through the LinkedIn
+    circuit breaker. Network errors and 5xx responses count as failures.
+    """
+    breaker = get_breaker("linkedin", LINKEDIN_SLOW_CALL)
+    # Fail fast, before queueing for a rate limit token
+    breaker.check()
+    return await get_rate_limiter().request(
+        access_token,
+        lambda: breaker.call(send, is_failure=lambda response: response.status_code >= 500),
+        stage=stage
+    )
+
+
+def get_upload_size(upload: UploadFile) -> int:
+    """Size of an uploaded file in bytes, without reading its content."""
+    if upload.size is not None:
+        return upload.size
+    # Fall back to the spooled file's length (seek/tell, no copy)
+    position = upload.file.tell()
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(position)
+    return size
+
+
+async def _iter_file(
+    upload: UploadFile,
+    on_complete: Optional[Callable[[str], None]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yields the file in UPLOAD_CHUNK_SIZE chunks, starting from the beginning.
+
+    If `on_complete` is given, the sha256 of the content is computed from the
+    same chunks and passed to it once the whole file has been streamed.
+    """
+    hasher = hashlib.sha256() if on_complete else None
+    await upload.seek(0)
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        if hasher:
+            hasher.update(chunk)
+        yield chunk
+    if on_complete:
+        on_complete(hasher.hexdigest())
+
+
+def _media_entry(index: int, image_file: UploadFile, asset_id: str) -> dict:
+    return {
+        "status": "READY",
+        "description": {"text": f"Image {index+1}"},
+        "media": asset_id,
+        "title": {"text": image_file.filename or f"Image {index+1}"}
+    }
+
+
+async def _upload_image(
+    client: httpx.AsyncClient,
+    access_token: str,
+    user_id: str,
+    index: int,
+    total: int,
+    image_file: UploadFile,
+    digest: Optional[str] = None
+) -> dict:
+    """
+    Registers and uploads a single image, or reuses the asset already uploaded
+    for the same owner and content.
+
+    `digest` is the sha256 of the image if the caller already knows it; only
+    then can the upload be skipped. Otherwise it is computed while the body
+    streams to LinkedIn, and the new asset is cached under it.
+
+    Returns:
+        The media entry for the ugcPosts payload
+
+    Raises:
+        Exception: if registration or upload fails after all retries
+    """
+    print(f"Processing image {index+1}/{total}: {image_file.filename}")
+
+    cached_asset = await get_asset_cache().get(user_id, digest) if digest else None
+    if cached_asset:
+        print(f"Reusing asset for image {index+1}: {cached_asset}")
+        return _media_entry(index, image_file, cached_asset)
+    
+    # Register upload with LinkedIn
+    register_url = f"{LINKEDIN_API_BASE}/v2/assets?action=registerUpload"
+    register_headers = {
+        "Authorization": f"Bearer {access_token}",
+        "X-Restli-Protocol-Version": "2.0.0",
+        "Content-Type": "application/json"
+    }
+    
+    register_payload = {
+        "registerUploadRequest": {
+            "owner": f"urn:li:person:{user_id}",
+            "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
+            "serviceRelationships": [
+                {
+                    "relationshipType": "OWNER",
+                    "identifier": "urn:li:userGeneratedContent"
+                }
+            ],
+            "supportedUploadMechanism": ["SYNCHRONOUS_UPLOAD"]
+        }
+    }
+    
+    # Register the upload
+    register_response = await _linkedin_request(access_token, lambda: client.post(
+        register_url, 
+        headers=register_headers, 
+        json=register_payload
+    ), stage="linkedin_register_upload")
+    _check_authorized(register_response)
+    
+    if register_response.status_code != 200:
+        error_detail = register_response.text or f"Status: {register_response.status_code}"
+        raise Exception(f"Image registration failed: {error_detail}")
+    
+    upload_data = register_response.json()
+    
+    # Extract upload URL and asset ID
+    upload_mechanism = upload_data['value']['uploadMechanism']['com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest']
+    upload_url = upload_mechanism['uploadUrl']
+    asset_id = upload_data['value']['asset']
+    
+    print(f"Asset ID for image {index+1}: {asset_id}")
+    
+    # Upload the actual file with retry logic
+    upload_headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Length": str(get_upload_size(image_file))
+    }
+    
+    max_retries = 3
+    # Digest of the last fully streamed attempt, when the caller didn't know it
+    streamed_digests: List[str] = []
+    
+    for attempt in range(max_retries):
+        try:
+            # Stream the spooled file in chunks instead of buffering it in memory
+            upload_response = await _linkedin_request(access_token, lambda: client.put(
+                upload_url,
+                headers=upload_headers,
+                content=_iter_file(image_file, on_complete=None if digest else streamed_digests.append)
+            ), stage="linkedin_image_put")
+            _check_authorized(upload_response)
+            
+            if upload_response.status_code == 201:
+                print(f"Image {index+1} uploaded successfully!")
+                break
+            else:
+                print(f"Upload attempt {attempt + 1} failed: {upload_response.status_code}")
+                if attempt == max_retries - 1:
+                    raise Exception(f"Upload failed: {upload_response.status_code} - {upload_response.text}")
+                    
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            print(f"Network error on attempt {attempt + 1}: {e}")
+            if attempt == max_retries - 1:
+                raise Exception(f"Failed to upload after {max_retries} attempts")
+            await asyncio.sleep(2 ** attempt)  # Exponential backoff
+
+    digest = digest or (streamed_digests[-1] if streamed_digests else None)
+    if digest:
+        await get_asset_cache().put(user_id, digest, asset_id)
+    
+    return _media_entry(index, image_file, asset_id)
+
+
+async def _upload_images(
+    client: httpx.AsyncClient,
+    access_token: str,
+    user_id: str,
+    image_files: List[UploadFile],
+    on_progress: Optional[ProgressCallback] = None,
+    image_hashes: Optional[List[Optional[str]]] = None
+) -> List[dict]:
+    """
+    Uploads all images concurrently, at most IMAGE_UPLOAD_CONCURRENCY at a time.
+
+    Media entries are returned in the same order as `image_files`. The first
+    failure cancels the uploads still in flight and is re-raised as
+    ImageUploadError.
+    """
+    semaphore = asyncio.Semaphore(IMAGE_UPLOAD_CONCURRENCY)
+    total = len(image_files)
+    uploaded = 0
+
+    async def upload(index: int, image_file: UploadFile) -> dict:
+        nonlocal uploaded
+        async with semaphore:
+            try:
+                digest = image_hashes[index] if image_hashes else None
+                media = await _upload_image(client, access_token, user_id, index, total, image_file, digest)
+            except LinkedInAuthError:
+                raise
+            except Exception as e:
+                print(f"Failed to upload image {index+1}: {str(e)}")
+                raise ImageUploadError(f"Failed to upload image {index+1}: {str(e)}") from e
+        uploaded += 1
+        if on_progress:
+            await on_progress("uploading_images", {"uploaded": uploaded, "total": total})
+        return media
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(upload(i, f)) for i, f in enumerate(image_files)]
+    except* LinkedInAuthError as failures:
+        raise failures.exceptions[0] from None
+    except* ImageUploadError as failures:
+        raise failures.exceptions[0] from None
+
+    return [task.result() for task in tasks]
+
+
+async def post_to_linkedin(
+    user_id: str,
+    text: str,
+    image_files: Optional[List[UploadFile]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    image_hashes: Optional[List[Optional[str]]] = None
+):
     """
     Posts content to LinkedIn with optional image uploads.
     
@@ -12,162 +262,97 @@ async def post_to_linkedin(user_id: str, text: str, image_files: Optional[List[U
         user_id: LinkedIn user ID
         text: Post content text
         image_files: Optional list of image files to upload
+        on_progress: Optional async callback, called with (stage, details) as
+            the publish moves through token_lookup, uploading_images and
+            creating_post
+        image_hashes: Optional sha256 per image, used to reuse assets
+            uploaded before instead of uploading the same bytes again
     
     Returns:
         Dict with success status and post details or error message
     """
     
-    # Get user access token from database
-    res = supabase.table("users").select("access_token").eq("linkedin_id", user_id).execute()
-    if not res.data:
+    async def report(stage: str, details: Optional[dict] = None):
+        if on_progress:
+            await on_progress(stage, details or {})
+
+    # Get user access token, from the cache when possible
+    await report("token_lookup")
+    with span("token_lookup"):
+        access_token = await get_token_cache().get(user_id)
+    if not access_token:
         return {"error": "User not found"}
     
-    access_token = res.data[0]["access_token"]
     author_urn = f"urn:li:person:{user_id}"
     
-    # Configure HTTP client
-    timeout = httpx.Timeout(30.0, read=60.0)
+    # Shared, pooled HTTP client (managed by the app lifespan)
+    client = get_http_client()
     media_list = []
     
     try:
-        async with httpx.AsyncClient(timeout=timeout, verify=True) as client:
-            
-            # Step 1: Upload images if provided
-            if image_files:
-                print(f"Uploading {len(image_files)} images...")
-                
-                for i, image_file in enumerate(image_files):
-                    try:
-                        print(f"Processing image {i+1}/{len(image_files)}: {image_file.filename}")
-                        
-                        # Read file content
-                        file_content = await image_file.read()
-                        await image_file.seek(0)  # Reset file pointer
-                        
-                        # Register upload with LinkedIn
-                        register_url = "https://api.linkedin.com/v2/assets?action=registerUpload"
-                        register_headers = {
-                            "Authorization": f"Bearer {access_token}",
-                            "X-Restli-Protocol-Version": "2.0.0",
-                            "Content-Type": "application/json"
-                        }
-                        
-                        register_payload = {
-                            "registerUploadRequest": {
-                                "owner": f"urn:li:person:{user_id}",
-                                "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
-                                "serviceRelationships": [
-                                    {
-                                        "relationshipType": "OWNER",
-                                        "identifier": "urn:li:userGeneratedContent"
-                                    }
-                                ],
-                                "supportedUploadMechanism": ["SYNCHRONOUS_UPLOAD"]
-                            }
-                        }
-                        
-                        # Register the upload
-                        register_response = await client.post(
-                            register_url, 
-                            headers=register_headers, 
-                            json=register_payload
-                        )
-                        
-                        if register_response.status_code != 200:
-                            error_detail = register_response.text or f"Status: {register_response.status_code}"
-                            raise Exception(f"Image registration failed: {error_detail}")
-                        
-                        upload_data = register_response.json()
-                        
-                        # Extract upload URL and asset ID
-                        upload_mechanism = upload_data['value']['uploadMechanism']['com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest']
-                        upload_url = upload_mechanism['uploadUrl']
-                        asset_id = upload_data['value']['asset']
-                        
-                        print(f"Asset ID for image {i+1}: {asset_id}")
-                        
-                        # Upload the actual file with retry logic
-                        upload_headers = {"Authorization": f"Bearer {access_token}"}
-                        
-                        max_retries = 3
-                        upload_success = False
-                        
-                        for attempt in range(max_retries):
-                            try:
-                                upload_response = await client.put(
-                                    upload_url,
-                                    headers=upload_headers,
-                                    content=file_content
-                                )
-                                
-                                if upload_response.status_code == 201:
-                                    print(f"Image {i+1} uploaded successfully!")
-                                    upload_success = True
-                                    break
-                                else:
-                                    print(f"Upload attempt {attempt + 1} failed: {upload_response.status_code}")
-                                    if attempt == max_retries - 1:
-                                        raise Exception(f"Upload failed: {upload_response.status_code} - {upload_response.text}")
-                                        
-                            except (httpx.ConnectError, httpx.TimeoutException) as e:
-                                print(f"Network error on attempt {attempt + 1}: {e}")
-                                if attempt == max_retries - 1:
-                                    raise Exception(f"Failed to upload after {max_retries} attempts")
-                                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                        
-                        if upload_success:
-                            # Add to media list for the post
-                            media_list.append({
-                                "status": "READY",
-                                "description": {"text": f"Image {i+1}"},
-                                "media": asset_id,
-                                "title": {"text": image_file.filename or f"Image {i+1}"}
-                            })
-                            
-                    except Exception as e:
-                        print(f"Failed to upload image {i+1}: {str(e)}")
-                        return {"error": f"Failed to upload image {i+1}: {str(e)}"}
-            
-            # Step 2: Create the LinkedIn post
-            post_data = {
-                "author": author_urn,
-                "lifecycleState": "PUBLISHED",
-                "specificContent": {
-                    "com.linkedin.ugc.ShareContent": {
-                        "shareCommentary": {"text": text},
-                        "shareMediaCategory": "IMAGE" if media_list else "NONE",
-                        "media": media_list
-                    }
-                },
-                "visibility": {
-                    "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+        # Step 1: Upload images if provided
+        if image_files:
+            print(f"Uploading {len(image_files)} images...")
+            await report("uploading_images", {"uploaded": 0, "total": len(image_files)})
+            try:
+                media_list = await _upload_images(
+                    client, access_token, user_id, image_files, on_progress, image_hashes
+                )
+            except ImageUploadError as e:
+                return {"error": str(e)}
+        
+        # Step 2: Create the LinkedIn post
+        post_data = {
+            "author": author_urn,
+            "lifecycleState": "PUBLISHED",
+            "specificContent": {
+                "com.linkedin.ugc.ShareContent": {
+                    "shareCommentary": {"text": text},
+                    "shareMediaCategory": "IMAGE" if media_list else "NONE",
+                    "media": media_list
                 }
+            },
+            "visibility": {
+                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
             }
-            
-            print("Creating LinkedIn post...")
-            post_response = await client.post(
-                "https://api.linkedin.com/v2/ugcPosts",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json",
-                    "X-Restli-Protocol-Version": "2.0.0"
-                },
-                json=post_data
-            )
-            
-            if post_response.status_code == 201:
-                result = post_response.json()
-                return {
-                    "success": True,
-                    "post_id": result.get("id"),
-                    "message": "Post created successfully",
-                    "media_count": len(media_list),
-                    "has_images": len(media_list) > 0
-                }
-            else:
-                error_detail = post_response.text or f"Status: {post_response.status_code}"
-                return {"error": f"Failed to create post: {error_detail}"}
+        }
+        
+        print("Creating LinkedIn post...")
+        await report("creating_post")
+        post_response = await _linkedin_request(access_token, lambda: client.post(
+            f"{LINKEDIN_API_BASE}/v2/ugcPosts",
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+                "X-Restli-Protocol-Version": "2.0.0"
+            },
+            json=post_data
+        ), stage="linkedin_ugc_post")
+        _check_authorized(post_response)
+        
+        if post_response.status_code == 201:
+            result = post_response.json()
+            return {
+                "success": True,
+                "post_id": result.get("id"),
+                "message": "Post created successfully",
+                "media_count": len(media_list),
+                "has_images": len(media_list) > 0
+            }
+        else:
+            # A reused asset may have expired on LinkedIn's side; upload afresh next time
+            for digest in image_hashes or []:
+                if digest:
+                    await get_asset_cache().invalidate(user_id, digest)
+            error_detail = post_response.text or f"Status: {post_response.status_code}"
+            return {"error": f"Failed to create post: {error_detail}"}
                 
+    except LinkedInAuthError as e:
+        # Expired or revoked; the next publish re-reads whatever token is stored now
+        await get_token_cache().invalidate(user_id)
+        return {"error": str(e)}
+    except (RateLimitedError, CircuitOpenError) as e:
+        return {"error": str(e)}
     except httpx.ConnectError:
         return {"error": "Unable to connect to LinkedIn servers. Please check your internet connection."}
     except httpx.TimeoutException:
@@ -0,0 +1,314 @@
+"""Latency-aware routing across LLM providers.
+
+Each provider wraps one long-lived chat model (anything with LangChain's
+`ainvoke`/`astream`), and the router sends each request to the fastest
+healthy provider based on a rolling window of recent calls. With hedging on,
+a second provider is started if the first hasn't answered within
+`hedge_after` seconds, and whichever finishes second is cancelled.
+
+Each provider also has a circuit breaker. Providers whose breaker is open
+are skipped, and when all of them are open requests fail at once with
+CircuitOpenError instead of waiting on a provider that is down.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from metrics import span
+from circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from config import (
+    OPENAI_API_KEY, GROQ_API_KEY, GEMINI_API_KEY,
+    OPENAI_MODEL, GROQ_MODEL, GEMINI_MODEL, LLM_TEMPERATURE,
+    OPENAI_REVISE_MODEL, GROQ_REVISE_MODEL, GEMINI_REVISE_MODEL, LLM_REVISE_MAX_TOKENS,
+    LLM_PROVIDERS, LLM_HEDGE_AFTER, LLM_MAX_ERROR_RATE, LLM_SLOW_CALL,
+)
+
+
+def is_request_error(error: BaseException) -> bool:
+    """
+    True for a 4xx the provider answered a bad request with (too long, content
+    policy, ...). Timeouts (408) and rate limits (429) are about the provider.
+    """
+    # openai/groq errors carry `status_code`, google.api_core errors `code`
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        llm,
+        window: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+        breaker: Optional[CircuitBreaker] = None,
+        model: Optional[str] = None
+    ):
+        self.name = name
+        self.llm = llm
+        # Part of the router's model_tag, so a model change invalidates cached generations
+        self.model = model
+        self.breaker = breaker or CircuitBreaker(f"llm_{name}", LLM_SLOW_CALL, clock=clock)
+        self._clock = clock
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self.last_error_at: Optional[float] = None
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._outcomes.append(ok)
+        if ok:
+            self._latencies.append(latency)
+        else:
+            self.last_error_at = self._clock()
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self.percentile(0.50)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.percentile(0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def stats(self) -> dict:
+        return {
+            "p50": self.p50,
+            "p95": self.p95,
+            "error_rate": round(self.error_rate, 4),
+            "calls": len(self._outcomes),
+        }
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge_after: Optional[float] = None,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._clock = clock
+
+    def is_healthy(self, provider: Provider) -> bool:
+        if provider.error_rate <= self.max_error_rate:
+            return True
+        # Give a failing provider another chance once the cooldown has passed
+        return provider.last_error_at is not None and self._clock() - provider.last_error_at >= self.cooldown
+
+    def ranked(self) -> List[Provider]:
+        """
+        Healthy providers by p50 latency (untried ones first), then the rest by
+        error rate. Providers with an open breaker are left out.
+        """
+        available = [p for p in self.providers if p.breaker.state != "open"]
+        healthy = [p for p in available if self.is_healthy(p)]
+        unhealthy = [p for p in available if not self.is_healthy(p)]
+        healthy.sort(key=lambda p: p.p50 if p.p50 is not None else 0.0)
+        unhealthy.sort(key=lambda p: p.error_rate)
+        return healthy + unhealthy
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if every provider's breaker is open."""
+        if not self.ranked():
+            raise CircuitOpenError("LLM", min(p.breaker.retry_after() for p in self.providers))
+
+    def model_tag(self) -> str:
+        return ",".join(f"{p.name}:{p.model}" if p.model else p.name for p in self.providers)
+
+    def stats(self) -> dict:
+        return {
+            p.name: {**p.stats(), "healthy": self.is_healthy(p), "breaker": p.breaker.state}
+            for p in self.providers
+        }
+
+    async def _call(self, provider: Provider, prompt):
+        start = self._clock()
+        try:
+            with span("llm_call"):
+                response = await provider.breaker.call(
+                    lambda: provider.llm.ainvoke(prompt), ignore_error=is_request_error
+                )
+        except CircuitOpenError:
+            # Not tried, so nothing to record
+            raise
+        except asyncio.CancelledError:
+            # A cancelled hedge loser says nothing about the provider's health
+            raise
+        except Exception as e:
+            # A rejected request says nothing about the provider's health either
+            if not is_request_error(e):
+                provider.record(self._clock() - start, ok=False)
+            raise
+        provider.record(self._clock() - start, ok=True)
+        return response
+
+    async def ainvoke(self, prompt):
+        """Invoke the best provider, hedging or falling back to the next ones on failure."""
+        self.check()
+        order = self.ranked()
+        last_error: Optional[Exception] = None
+
+        while order:
+            primary = order.pop(0)
+            if self.hedge_after is None or not order:
+                try:
+                    return await self._call(primary, prompt)
+                except Exception as e:
+                    print(f"LLM provider {primary.name} failed: {e}")
+                    last_error = e
+                    continue
+
+            backup = order.pop(0)
+            try:
+                return await self._hedged(primary, backup, prompt)
+            except Exception as e:
+                last_error = e
+
+        raise last_error
+
+    async def _hedged(self, primary: Provider, backup: Provider, prompt):
+        first = asyncio.create_task(self._call(primary, prompt))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done and first.exception() is None:
+            return first.result()
+
+        print(f"Hedging LLM request: {primary.name} -> {backup.name}")
+        second = asyncio.create_task(self._call(backup, prompt))
+        pending = {first, second} - done
+        error: Optional[BaseException] = first.exception() if done else None
+
+        try:
+            while pending:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, prompt) -> AsyncIterator:
+        """
+        Stream from the best provider. Falls back to the next provider only if
+        the current one fails before producing any output.
+        """
+        self.check()
+        last_error: Optional[Exception] = None
+        for provider in self.ranked():
+            try:
+                trial = provider.breaker.before_call()
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            start = self._clock()
+            started = False
+            try:
+                with span("llm_stream"):
+                    async for chunk in provider.llm.astream(prompt):
+                        started = True
+                        yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                provider.breaker.abandon(trial)
+                raise
+            except Exception as e:
+                rejected = is_request_error(e)
+                if not rejected:
+                    provider.record(self._clock() - start, ok=False)
+                provider.breaker.record(self._clock() - start, rejected, trial)
+                if started:
+                    raise
+                print(f"LLM provider {provider.name} failed: {e}")
+                last_error = e
+                continue
+            provider.record(self._clock() - start, ok=True)
+            provider.breaker.record(self._clock() - start, True, trial)
+            return
+        raise last_error
+
+
+# One router per model tier: "default" for new posts, "revise" for edits of a draft
+_routers: Dict[str, LLMRouter] = {}
+
+
+def build_default_router(tier: str = "default") -> LLMRouter:
+    """
+    One long-lived client per configured provider, in LLM_PROVIDERS order.
+
+    The "revise" tier uses each provider's smaller *_REVISE_MODEL, with
+    output capped at LLM_REVISE_MAX_TOKENS.
+    """
+    from langchain_openai import ChatOpenAI
+    from langchain_groq import ChatGroq
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    revise = tier == "revise"
+    max_tokens = {"max_tokens": LLM_REVISE_MAX_TOKENS} if revise else {}
+    models = {
+        "openai": OPENAI_REVISE_MODEL if revise else OPENAI_MODEL,
+        "groq": GROQ_REVISE_MODEL if revise else GROQ_MODEL,
+        "gemini": GEMINI_REVISE_MODEL if revise else GEMINI_MODEL,
+    }
+    factories = {
+        "openai": (OPENAI_API_KEY, lambda: ChatOpenAI(
+            temperature=LLM_TEMPERATURE, model_name=models["openai"],
+            openai_api_key=OPENAI_API_KEY, **max_tokens
+        )),
+        "groq": (GROQ_API_KEY, lambda: ChatGroq(
+            temperature=LLM_TEMPERATURE, model_name=models["groq"],
+            groq_api_key=GROQ_API_KEY, **max_tokens
+        )),
+        "gemini": (GEMINI_API_KEY, lambda: ChatGoogleGenerativeAI(
+            temperature=LLM_TEMPERATURE, model=models["gemini"],
+            google_api_key=GEMINI_API_KEY,
+            **({"max_output_tokens": LLM_REVISE_MAX_TOKENS} if revise else {})
+        )),
+    }
+
+    def provider(name: str, factory) -> Provider:
+        # Breakers are per provider and shared by both tiers, and /health reports them
+        return Provider(name, factory(), breaker=get_breaker(f"llm_{name}", LLM_SLOW_CALL), model=models[name])
+
+    providers = [
+        provider(name, factory)
+        for name, (api_key, factory) in ((n, factories[n]) for n in LLM_PROVIDERS if n in factories)
+        if api_key
+    ]
+    if not providers:
+        # Keep the previous behaviour (and its error messages) when no key is set
+        providers = [provider("openai", factories["openai"][1])]
+    return LLMRouter(providers, hedge_after=LLM_HEDGE_AFTER, max_error_rate=LLM_MAX_ERROR_RATE)
+
+
+def get_router(tier: str = "default") -> LLMRouter:
+    router = _routers.get(tier)
+    if router is None:
+        router = _routers[tier] = build_default_router(tier)
+    return router
+
+
+def set_router(router: LLMRouter, tier: str = "default") -> None:
+    """Swap a tier's router, e.g. for one with fake providers in tests and benchmarks."""
+    _routers[tier] = router
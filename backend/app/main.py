@@ -1,13 +1,56 @@
-from fastapi import FastAPI, File, HTTPException, UploadFile, Form
+from fastapi import FastAPI, File, HTTPException, UploadFile, Form, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from oauth import router as oauth_router
-from linkedin import post_to_linkedin
+from linkedin import get_upload_size
 from typing import List, Literal, Optional
-from Generate_post import generate_post, store_generated_post
-import supabase
-from db import supabase
+from Generate_post import generate_and_store_post, store_generated_post, stream_post, clean_generated_text, generation_cache, generate_posts_batch, revise_post, REVISE_COLUMNS
+from pydantic import BaseModel, Field
+from config import BATCH_MAX_ITEMS, BATCH_MAX_VARIANTS
+from contextlib import asynccontextmanager
+import hashlib
+import json
+from http_client import open_http_client, close_http_client
+from repository import get_repository, close_repository, POST_COLUMNS, encode_cursor, decode_cursor
+from llm_router import get_router
+from rate_limiter import get_rate_limiter
+from token_cache import get_token_cache
+from asset_cache import get_asset_cache
+from publish_queue import get_publish_queue, public_job
+from scheduler import get_scheduler
+from post_writer import PostWriteTimeout, get_post_writer, get_post, list_posts
+from image_processing import close_image_pool
+from shared_state import close_shared_state
+from metrics import ServerTimingMiddleware, render_prometheus
+from admission import AdmissionRejected, cancel_on_disconnect, get_admission
+from circuit_breaker import CircuitOpenError, breakers
+from datetime import datetime
 
-app = FastAPI(title="LinkedIn Post Generator")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client for all LinkedIn traffic, closed on shutdown
+    await open_http_client()
+    await get_post_writer().start()
+    # server.py sets these to False in all but one worker
+    await get_publish_queue().start(resume=getattr(app.state, "resume_publish_jobs", True))
+    # Only one worker dispatches scheduled posts; the others just store the times
+    if getattr(app.state, "run_scheduler", True):
+        await get_scheduler().start()
+    try:
+        yield
+    finally:
+        await get_scheduler().stop()
+        await get_publish_queue().stop()
+        # Generated posts still buffered are written before the repository closes
+        await get_post_writer().stop()
+        close_image_pool()
+        await close_http_client()
+        await close_repository()
+        await close_shared_state()
+
+
+app = FastAPI(title="LinkedIn Post Generator", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -21,16 +64,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage timings of each request, in its Server-Timing response header
+app.add_middleware(ServerTimingMiddleware)
+
 # Include the OAuth router
 app.include_router(oauth_router, tags=["auth"])
 
+
+@app.exception_handler(AdmissionRejected)
+@app.exception_handler(CircuitOpenError)
+@app.exception_handler(PostWriteTimeout)
+async def service_unavailable(request: Request, exc):
+    # Shed load early instead of letting the request time out in a queue or
+    # on a dependency that is down
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to LinkedIn Post Generator API"}
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}         
+    """
+    Always 200 while the app is up; `status` is "degraded" while a
+    dependency's circuit breaker is open or half-open.
+    """
+    dependencies = {name: breaker.stats() for name, breaker in breakers().items()}
+    degraded = any(stats["state"] != "closed" for stats in dependencies.values())
+    return {"status": "degraded" if degraded else "ok", "dependencies": dependencies}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency histograms in Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the generation cache, for sizing it."""
+    return generation_cache.stats()
+
+
+@app.get("/llm/stats")
+def llm_stats():
+    """Rolling latency and error rate per LLM provider."""
+    return get_router().stats()
+
+
+@app.get("/admission/stats")
+def admission_stats():
+    """LLM generation slots in use, queue depth, wait times and rejections."""
+    return get_admission().stats()
+
+
+@app.get("/post_writer/stats")
+def post_writer_stats():
+    """Generated posts waiting to be written, batch sizes and failed writes."""
+    return get_post_writer().stats()
+
+
+@app.get("/linkedin/stats")
+def linkedin_stats():
+    """Client-side LinkedIn throttling (rates, 429s, time queued) and token/asset cache counters."""
+    return {
+        **get_rate_limiter().stats(),
+        "token_cache": get_token_cache().stats(),
+        "asset_cache": get_asset_cache().stats(),
+    }
 
 
 @app.post("/Post_to_linkedin/{post_id}")
@@ -38,10 +143,16 @@ async def upload_linkedin_post(
     user_id: str,
     post_id: str,
     files: Optional[List[UploadFile]] = File(None),
-    text: Optional[str] = Form(None)
+    text: Optional[str] = Form(None),
     ##changed form to accept text
+    idempotency_key: Optional[str] = Header(None)
 ):
-    """Create a LinkedIn post with optional images."""
+    """
+    Queue a LinkedIn post with optional images.
+
+    Returns 202 with a job id right away. Sending the same Idempotency-Key
+    header again returns the existing job instead of posting twice.
+    """
     try:
         
         if files:
@@ -53,73 +164,285 @@ async def upload_linkedin_post(
                         detail=f"File '{file.filename}' is not an image"
                     )
                 
-                # Check file size (10MB limit)
-                content = await file.read()
-                await file.seek(0)  # Reset file pointer
-                
-                if len(content) > 10 * 1024 * 1024:
+                # Check file size (10MB limit) from the spooled file, without reading it
+                if get_upload_size(file) > 10 * 1024 * 1024:
                     raise HTTPException(
                         status_code=400, 
                         detail=f"File '{file.filename}' is too large (max 10MB)"
                     )
         
 
-        post = supabase.table("generated_posts").select("*").eq("id", post_id).execute()
-        if not post.data:
+        post_data = await get_post(post_id, "user_id" if text else "user_id, generated_text")
+        if not post_data:
              raise HTTPException(status_code=404, detail="Post not found")
-             
-        post_data = post.data[0]
+
         ##added final_text here
         final_text = text if text else post_data["generated_text"]
 
-        # Create the post
-        result = await post_to_linkedin(user_id=post_data["user_id"], text=final_text, image_files=files)
-
-        # Handle errors
-        if "error" in result:
-            if "User not found" in result["error"]:
-                raise HTTPException(status_code=404, detail=result["error"])
-            elif "connect" in result["error"].lower():
-                raise HTTPException(status_code=503, detail=result["error"])
-            elif "timeout" in result["error"].lower():
-                raise HTTPException(status_code=504, detail=result["error"])
-            else:
-                raise HTTPException(status_code=400, detail=result["error"])
-            
-        if "id" in result:
-            supabase.table("generated_posts").update({
-                "posted": True,
-                "post_id": result["id"]
-            }).eq("id", post_id).execute()
-        
-        return result
+        # Retries of the same request map to the same job instead of posting twice,
+        # unless that job failed
+        if not idempotency_key:
+            fingerprint = hashlib.sha256(final_text.encode())
+            for file in files or []:
+                fingerprint.update(f"{file.filename}:{get_upload_size(file)}".encode())
+            idempotency_key = f"{post_id}:{fingerprint.hexdigest()}"
+
+        # Publishing runs in the background; poll /publish_jobs/{job_id} for progress
+        job, created = await get_publish_queue().enqueue(
+            post_id=post_id,
+            user_id=post_data["user_id"],
+            text=final_text,
+            files=files,
+            idempotency_key=idempotency_key
+        )
+
+        return JSONResponse(
+            status_code=202,
+            content={
+                "job_id": job["id"],
+                "status": job["status"],
+                "duplicate": not created,
+                "status_url": f"/publish_jobs/{job['id']}"
+            }
+        )
         
-    except HTTPException:
+    except (HTTPException, CircuitOpenError, PostWriteTimeout):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
 @app.get("/create_post/")
-async def create_post(user_id: str, text: str,   length: Literal["short", "medium", "long"], note:str):
+async def create_post(request: Request, user_id: str, text: str,   length: Literal["short", "medium", "long"], note:str, fresh: bool = False):
 
-    generated_result = await generate_post(user_id=user_id, text=text,length=length,note=note)
-        
-    
-    stored_post = await store_generated_post(
-        user_id=user_id,
-        generated_text=generated_result["generated_text"],
-        original_text=text,
-        length=length,
-        note=note
+    # A repeat of the same request returns the post stored the first time
+    generated_result = await cancel_on_disconnect(
+        request, generate_and_store_post(user_id=user_id, text=text,length=length,note=note, fresh=fresh)
     )
-    
+    if generated_result["status"] != "success":
+        raise HTTPException(status_code=500, detail=f"Failed to generate post: {generated_result.get('error')}")
+
     return {
-        "post_id": stored_post["id"],
+        "post_id": generated_result["post_id"],
         "generated_text": generated_result["generated_text"],
-        "message": "Post generated and stored successfully"
+        "message": "Post generated successfully"
+    }
+
+
+
+@app.post("/revise_post/{post_id}")
+async def revise_stored_post(
+    request: Request,
+    post_id: str,
+    user_id: str,
+    instruction: str = Query(min_length=1, max_length=300),
+    fresh: bool = False
+):
+    """
+    Apply a small edit ("shorter", "stronger hook") to a stored post.
+
+    Much cheaper than /create_post/: only the instruction and the draft go to
+    a smaller model. The result is stored as a new version of the post,
+    linked to it by `parent_id`. Repeating an instruction returns the same
+    revision; `fresh=true` makes a new one.
+    """
+    post_data = await get_post(post_id, REVISE_COLUMNS)
+    if not post_data or post_data["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    result = await cancel_on_disconnect(request, revise_post(post_data, instruction, fresh=fresh))
+    if result["status"] != "success":
+        raise HTTPException(status_code=500, detail=f"Failed to revise post: {result.get('error')}")
+
+    return {
+        "post_id": result["post_id"],
+        "parent_id": result["parent_id"],
+        "version": result["version"],
+        "generated_text": result["generated_text"],
+        "message": "Post revised successfully"
+    }
+
+
+@app.post("/schedule_post/{post_id}")
+async def schedule_post(post_id: str, publish_at: datetime):
+    """
+    Publish a stored post at `publish_at` (ISO 8601; UTC if no offset is given).
+
+    Scheduling again moves the post to the new time.
+    """
+    post_data = await get_post(post_id, "posted")
+    if not post_data:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if post_data["posted"]:
+        raise HTTPException(status_code=409, detail="Post is already published")
+
+    scheduled_at = await get_scheduler().schedule(post_id, publish_at)
+    return {"post_id": post_id, "scheduled_at": scheduled_at}
+
+
+@app.delete("/schedule_post/{post_id}")
+async def unschedule_post(post_id: str):
+    """Cancel a scheduled publish that has not been dispatched yet."""
+    post_data = await get_post(post_id, "id")
+    if not post_data:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    await get_scheduler().unschedule(post_id)
+    return {"post_id": post_id, "scheduled_at": None}
+
+
+# Returned by /post_history when no columns are asked for; leaves out the long texts
+HISTORY_COLUMNS = "id, created_at, posted, length, version, parent_id, scheduled_at"
+
+
+@app.get("/post_history")
+async def post_history(
+    user_id: str,
+    columns: Optional[str] = None,
+    posted: Optional[bool] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """
+    The member's posts, newest first, `limit` at a time.
+
+    `columns` is a comma-separated subset of the generated_posts columns
+    (default: HISTORY_COLUMNS, without the post texts). Pass the returned
+    `next_cursor` as `cursor` to get the following page; it is null on the
+    last page.
+    """
+    requested = [c.strip() for c in (columns or HISTORY_COLUMNS).split(",") if c.strip()]
+    unknown = [c for c in requested if c not in POST_COLUMNS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}; allowed: {', '.join(POST_COLUMNS)}")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The cursor is built from created_at and id, so those are always read
+    selected = list(dict.fromkeys(requested + ["created_at", "id"]))
+    # One extra row tells whether there is a next page
+    rows = await list_posts(user_id, ", ".join(selected), limit + 1, after, posted)
+    page = rows[:limit]
+    return {
+        "posts": [{c: row.get(c) for c in requested} for row in page],
+        "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None
+    }
+
+
+@app.get("/scheduler/stats")
+def scheduler_stats():
+    """Posts held in the scheduler's in-memory window and dispatch counters."""
+    return get_scheduler().stats()
+
+
+@app.get("/publish_jobs/{job_id}")
+async def publish_job_status(job_id: str):
+    """Status and current stage of a queued LinkedIn publish."""
+    job = await get_repository().get_publish_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_job(job)
+
+
+class BatchItem(BaseModel):
+    text: str
+    length: Literal["short", "medium", "long"]
+    note: str
+
+
+class BatchRequest(BaseModel):
+    user_id: str
+    items: List[BatchItem] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+    variants: int = Field(default=1, ge=1, le=BATCH_MAX_VARIANTS)
+
+
+@app.post("/create_posts/batch")
+async def create_posts_batch(request: Request, batch: BatchRequest):
+    """
+    Generate several posts (and variants of each) in one request.
+
+    Generations run concurrently and are stored with a single bulk insert.
+    A failed item does not fail the batch; check each result's status.
+    """
+    results = await cancel_on_disconnect(request, generate_posts_batch(
+        user_id=batch.user_id,
+        items=[item.model_dump() for item in batch.items],
+        variants=batch.variants
+    ))
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded
     }
 
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/create_post/stream")
+async def create_post_stream(user_id: str, text: str, length: Literal["short", "medium", "long"], note: str):
+    """
+    Streaming variant of /create_post/ over Server-Sent Events.
+
+    Emits a `token` event per LLM chunk, then a single `done` event with the
+    stored `post_id` and the final text (or an `error` event).
+    """
+    async def events():
+        chunks = []
+        admitted = False
+        try:
+            # Fail fast while every LLM provider is down, then wait for a slot
+            get_router().check()
+            async with get_admission().slot():
+                admitted = True
+                # The first (empty) item only tells the endpoint the slot is taken
+                yield ""
+                async for chunk in stream_post(user_id=user_id, text=text, length=length, note=note):
+                    chunks.append(chunk)
+                    yield _sse("token", {"text": chunk.replace('"', '')})
+
+            generated_text = clean_generated_text("".join(chunks))
+            stored_post = await store_generated_post(
+                user_id=user_id,
+                generated_text=generated_text,
+                original_text=text,
+                length=length,
+                note=note
+            )
+        except HTTPException as e:
+            yield _sse("error", {"error": e.detail})
+            return
+        except Exception as e:
+            if not admitted:
+                # No response yet; answered with a 503 by the endpoint
+                raise
+            yield _sse("error", {"error": str(e)})
+            return
+
+        yield _sse("done", {
+            "post_id": stored_post["id"],
+            "generated_text": generated_text,
+            "message": "Post generated successfully"
+        })
+
+    stream = events()
+    # Wait for a generation slot before starting the response, so overload
+    # or an LLM outage can still be answered with 503. A client that
+    # disconnects mid-stream cancels the stream, which gives the slot back.
+    await anext(stream)
+
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        # Disable caching and proxy buffering so tokens reach the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 if __name__== "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=4000)
\ No newline at end of file
@@ -11,18 +11,23 @@ to gain limited access to user accounts."""
 6. Store user info and token in Supabase.
 """
 
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Request, HTTPException
 from fastapi.responses import RedirectResponse
 import httpx
 import asyncio
-from config import LINKEDIN_CLIENT_ID, LINKEDIN_CLIENT_SECRET, LINKEDIN_REDIRECT_URI
-from db import supabase
+from config import LINKEDIN_CLIENT_ID, LINKEDIN_CLIENT_SECRET, LINKEDIN_REDIRECT_URI, LINKEDIN_API_BASE, LINKEDIN_OAUTH_BASE, LINKEDIN_SLOW_CALL
+from repository import get_repository
+from token_cache import get_token_cache
+from metrics import span
+from circuit_breaker import CircuitOpenError, get_breaker
+from http_client import get_http_client
 from urllib.parse import urlencode
 
 router = APIRouter()
 
-AUTH_URL = "https://www.linkedin.com/oauth/v2/authorization"
-TOKEN_URL = "https://www.linkedin.com/oauth/v2/accessToken"
+AUTH_URL = f"{LINKEDIN_OAUTH_BASE}/authorization"
+TOKEN_URL = f"{LINKEDIN_OAUTH_BASE}/accessToken"
+USERINFO_URL = f"{LINKEDIN_API_BASE}/v2/userinfo"
 
 @router.get("/auth/linkedin")
 def linkedin_login():
@@ -34,122 +39,129 @@ def linkedin_login():
     )
     return RedirectResponse(url)
 
+async def save_user_record(linkedin_id: str, name: str, email: str, access_token: str) -> None:
+    """Persist the user after the redirect has gone out, retrying transient failures."""
+    for attempt in range(3):
+        try:
+            result = await get_repository().save_user(
+                linkedin_id=linkedin_id,
+                name=name,
+                email=email,
+                access_token=access_token
+            )
+            print(f"Stored user: {result}")
+            return
+        except Exception as db_error:
+            print(f"Database error (attempt {attempt + 1}): {db_error}")
+            if attempt < 2:
+                await asyncio.sleep(2 ** attempt)
+
+
 @router.get("/auth/callback")
-async def linkedin_callback(code: str):
+async def linkedin_callback(code: str, background_tasks: BackgroundTasks):
     try:
         print(f"Received code: {code}")
         
-        # Use httpx with more aggressive connection settings
-        timeout = httpx.Timeout(30.0)
-        limits = httpx.Limits(max_keepalive_connections=5, max_connections=10)
+        # Shared, pooled HTTP client (managed by the app lifespan)
+        client = get_http_client()
+        # Fails fast while LinkedIn is down instead of waiting out the timeouts
+        breaker = get_breaker("linkedin", LINKEDIN_SLOW_CALL)
+
+        def server_error(response: httpx.Response) -> bool:
+            return response.status_code >= 500
+
+        # Exchange code for access token
+        token_data = {
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": LINKEDIN_REDIRECT_URI,
+            "client_id": LINKEDIN_CLIENT_ID,
+            "client_secret": LINKEDIN_CLIENT_SECRET,
+        }
+        
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        
+        print("Exchanging code for token...")
         
-        async with httpx.AsyncClient( 
-            timeout=timeout, 
-            limits=limits,
-            http2=False,  
-            follow_redirects=True
-        ) as client:
-            # Exchange code for access token
-            token_data = {
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": LINKEDIN_REDIRECT_URI,
-                "client_id": LINKEDIN_CLIENT_ID,
-                "client_secret": LINKEDIN_CLIENT_SECRET,
-            }
-            
-            headers = {"Content-Type": "application/x-www-form-urlencoded"}
-            
-            print("Exchanging code for token...")
-            
-            # Try the request with retries
-            for attempt in range(3):
-                try:
-                    token_response = await client.post(TOKEN_URL, data=token_data, headers=headers)
-                    break
-                except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
-                    print(f"Attempt {attempt + 1} failed: {e}")
-                    if attempt == 2:  # Last attempt
-                        raise
-                    await asyncio.sleep(1)  # Wait 1 second before retry
-            
-            print(f"Token response status: {token_response.status_code}")
-            if token_response.status_code != 200:
-                print(f"Token error response: {token_response.text}")
-                raise HTTPException(status_code=400, detail=f"Failed to get token: {token_response.text}")
-            
-            token_json = token_response.json()
-            access_token = token_json.get("access_token")
-            
-            if not access_token:
-                print(f"No access token in response: {token_json}")
-                raise HTTPException(status_code=400, detail="No access token received")
-            
-            print("Got access token, fetching profile...")
-            
-            # Get user profile with retry
-            profile_headers = {"Authorization": f"Bearer {access_token}"}
-            for attempt in range(3):
-                try:
-                    profile_response = await client.get("https://api.linkedin.com/v2/userinfo", headers=profile_headers)
-                    break
-                except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
-                    print(f"Profile attempt {attempt + 1} failed: {e}")
-                    if attempt == 2:  # Last attempt
-                        raise
-                    await asyncio.sleep(1)  # Wait 1 second before retry
-            
-            print(f"Profile response status: {profile_response.status_code}")
-            if profile_response.status_code != 200:
-                print(f"Profile error response: {profile_response.text}")
-                raise HTTPException(status_code=400, detail=f"Failed to get profile: {profile_response.text}")
-            
-            profile = profile_response.json()
-            print(f"Profile data: {profile}")
-            
-            linkedin_id = profile.get("sub")  # Standard OpenID Connect claim
-            name = profile.get("name", "")  # Full name from userinfo
-            email = profile.get("email", f"user_{profile.get('sub')}@linkedin.local")  # Email if available
-            
-            print(f"Storing user: {linkedin_id}, {name}, {email}")
-            
+        # Try the request with retries
+        for attempt in range(3):
             try:
-                existing_user = supabase.table("users").select("id, linkedin_id").eq("linkedin_id", linkedin_id).execute()
-                
-                if existing_user.data:
-                    # User exists, update their info using the UUID primary key
-                    user_id = existing_user.data[0]["id"]
-                    result = supabase.table("users").update({
-                        "name": name,
-                        "email": email,
-                        "access_token": access_token
-                    }).eq("id", user_id).execute()
-                    print(f"Updated existing user with ID {user_id}: {result}")
-                else:
-                    # New user, insert (UUID will be auto-generated)
-                    result = supabase.table("users").insert({
-                        "linkedin_id": linkedin_id,
-                        "name": name,
-                        "email": email,
-                        "access_token": access_token
-                    }).execute()
-                    print(f"Inserted new user: {result}")
-                
-            except Exception as db_error:
-                print(f"Database error: {db_error}")
-                # Continue anyway
-            
-            # Redirect to React frontend with user info
-            frontend_url = "https://linkfluenceai.vercel.app/"
-            params = {
-                "linkedin_id": linkedin_id,
-                "name": name,
-                "email": email
-            }
-            redirect_url = f"{frontend_url}?{urlencode(params)}"
-            
-            return RedirectResponse(url=redirect_url)
+                with span("oauth_token_exchange"):
+                    token_response = await breaker.call(
+                        lambda: client.post(TOKEN_URL, data=token_data, headers=headers), server_error
+                    )
+                break
+            except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
+                print(f"Attempt {attempt + 1} failed: {e}")
+                if attempt == 2:  # Last attempt
+                    raise
+                await asyncio.sleep(1)  # Wait 1 second before retry
+        
+        print(f"Token response status: {token_response.status_code}")
+        if token_response.status_code != 200:
+            print(f"Token error response: {token_response.text}")
+            raise HTTPException(status_code=400, detail=f"Failed to get token: {token_response.text}")
+        
+        token_json = token_response.json()
+        access_token = token_json.get("access_token")
+        
+        if not access_token:
+            print(f"No access token in response: {token_json}")
+            raise HTTPException(status_code=400, detail="No access token received")
+        
+        print("Got access token, fetching profile...")
+        
+        # Get user profile with retry
+        profile_headers = {"Authorization": f"Bearer {access_token}"}
+        for attempt in range(3):
+            try:
+                with span("oauth_userinfo"):
+                    profile_response = await breaker.call(
+                        lambda: client.get(USERINFO_URL, headers=profile_headers), server_error
+                    )
+                break
+            except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
+                print(f"Profile attempt {attempt + 1} failed: {e}")
+                if attempt == 2:  # Last attempt
+                    raise
+                await asyncio.sleep(1)  # Wait 1 second before retry
+        
+        print(f"Profile response status: {profile_response.status_code}")
+        if profile_response.status_code != 200:
+            print(f"Profile error response: {profile_response.text}")
+            raise HTTPException(status_code=400, detail=f"Failed to get profile: {profile_response.text}")
+        
+        profile = profile_response.json()
+        print(f"Profile data: {profile}")
+        
+        linkedin_id = profile.get("sub")  # Standard OpenID Connect claim
+        name = profile.get("name", "")  # Full name from userinfo
+        email = profile.get("email", f"user_{profile.get('sub')}@linkedin.local")  # Email if available
+        
+        print(f"Storing user: {linkedin_id}, {name}, {email}")
+
+        # Write through, so the next publish doesn't read back a stale token
+        await get_token_cache().put(linkedin_id, access_token)
+
+        # The token is already usable from the cache, so the login doesn't wait
+        # for the database: one upsert runs after the redirect is sent
+        background_tasks.add_task(save_user_record, linkedin_id, name, email, access_token)
+        
+        # Redirect to React frontend with user info
+        frontend_url = "https://linkfluenceai.vercel.app/"
+        params = {
+            "linkedin_id": linkedin_id,
+            "name": name,
+            "email": email
+        }
+        redirect_url = f"{frontend_url}?{urlencode(params)}"
+        
+        return RedirectResponse(url=redirect_url)
                 
+    except CircuitOpenError as e:
+        print(f"Skipping login: {e}")
+        return RedirectResponse(url="https://linkedin-post-generator-hbo2.onrender.com/?error=linkedin_unavailable")
+
     except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
         print(f"Connection error: {e}")
         # Redirect to frontend with error
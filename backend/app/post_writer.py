@@ -0,0 +1,285 @@
+"""Write-behind persistence for generated posts.
+
+Generation endpoints hand new `generated_posts` rows to the PostWriter and
+respond right away, with an id generated client-side. Rows are written with
+one bulk insert per batch: as soon as POST_WRITE_BATCH rows are pending, or
+POST_WRITE_INTERVAL seconds after the first of them arrived. Everything
+still buffered is flushed on shutdown.
+
+Inserts that fail for a transient reason (connection, timeout, 5xx) are
+retried with backoff, up to POST_WRITE_ATTEMPTS times. If the database
+rejects a batch (e.g. a row whose user_id has no users row), its rows are
+inserted one by one, so only the bad row fails and the rest are stored.
+Rows that can't be stored are dropped, logged and counted in the stats.
+
+The buffer holds at most POST_WRITE_MAX_PENDING rows (pending or being
+written); beyond that, new rows wait for room, which slows generation down
+to the rate the database keeps up with instead of growing without bound.
+
+Reads go through `get_post` and `list_posts`, which wait for the inserts
+they depend on first, so a client can publish, revise or list a post right
+after it was generated. They wait at most POST_WRITE_WAIT_TIMEOUT seconds,
+then raise PostWriteTimeout (served as 503 with Retry-After).
+"""
+
+import asyncio
+import math
+import uuid
+from typing import Dict, List, Optional, Tuple
+from config import (
+    POST_WRITE_BATCH, POST_WRITE_INTERVAL, POST_WRITE_MAX_PENDING,
+    POST_WRITE_ATTEMPTS, POST_WRITE_WAIT_TIMEOUT,
+)
+from metrics import gauge, span
+from repository import get_repository, is_client_error
+
+
+class PostWriteError(Exception):
+    """Set for a buffered post that could not be stored."""
+
+
+class PostWriteTimeout(Exception):
+    """Raised when a buffered post isn't stored in time; `retry_after` is in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generated posts are still being saved, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PostWriter:
+    def __init__(
+        self,
+        max_batch: int,
+        flush_interval: float,
+        max_pending: int,
+        max_attempts: int = 8,
+        wait_timeout: float = 10.0,
+        shutdown_attempts: int = 3
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.wait_timeout = wait_timeout
+        self.shutdown_attempts = shutdown_attempts
+        self._pending: List[dict] = []
+        # Resolved once the row with that id is stored; covers pending and in-flight rows
+        self._written: Dict[str, asyncio.Future] = {}
+        # user_id of each of those rows
+        self._owners: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._has_rows: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._room: Optional[asyncio.Condition] = None
+        self.rows = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.lost = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._written)
+
+    async def start(self) -> None:
+        self._closing = False
+        self._has_rows = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still buffered, then stop."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._has_rows.set()
+        self._batch_full.set()
+        await self._task
+        self._task = None
+
+    async def add(self, row: dict) -> dict:
+        """Queue a row for insert. Returns it with its new `id` without waiting for the write."""
+        return (await self.add_many([row]))[0]
+
+    async def add_many(self, rows: List[dict]) -> List[dict]:
+        rows = [{"id": str(uuid.uuid4()), **row} for row in rows]
+        if not self.running:
+            # Outside the app (scripts, benchmarks) rows are written straight away
+            return await get_repository().insert_posts(rows)
+
+        if self.buffered + len(rows) > self.max_pending:
+            with span("post_write_backpressure"):
+                async with self._room:
+                    await self._room.wait_for(lambda: self.buffered + len(rows) <= max(self.max_pending, len(rows)))
+
+        loop = asyncio.get_running_loop()
+        for row in rows:
+            self._written[row["id"]] = loop.create_future()
+            self._owners[row["id"]] = row.get("user_id")
+            self._pending.append(row)
+        self._has_rows.set()
+        if len(self._pending) >= self.max_batch:
+            self._batch_full.set()
+        return rows
+
+    async def _wait(self, awaitable) -> None:
+        try:
+            await asyncio.wait_for(asyncio.shield(awaitable), self.wait_timeout)
+        except asyncio.TimeoutError:
+            raise PostWriteTimeout(max(1, math.ceil(self.flush_interval + self.wait_timeout)))
+
+    async def flushed(self, post_id: str) -> None:
+        """
+        Wait until the post with `post_id` is stored, if it is still buffered.
+
+        Raises:
+            PostWriteError: if it could not be stored
+            PostWriteTimeout: if it isn't stored within `wait_timeout`
+        """
+        written = self._written.get(post_id)
+        if written is not None:
+            await self._wait(written)
+
+    async def flushed_user(self, user_id: str) -> None:
+        """
+        Wait until every post of `user_id` buffered so far is stored or has
+        failed. Raises PostWriteTimeout like `flushed`.
+        """
+        written = [self._written[i] for i, owner in self._owners.items() if owner == user_id]
+        if written:
+            await self._wait(asyncio.gather(*written, return_exceptions=True))
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_rows.wait()
+            if not self._pending:
+                if self._closing:
+                    return
+                self._has_rows.clear()
+                continue
+            # Give the batch a moment to fill, unless it already has
+            if len(self._pending) < self.max_batch and not self._closing:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if len(self._pending) < self.max_batch and not self._closing:
+                self._batch_full.clear()
+            await self._write(batch)
+
+    async def _write(self, batch: List[dict]) -> None:
+        error = await self._insert(batch)
+        if error is not None and is_client_error(error) and len(batch) > 1:
+            # One bad row fails the whole bulk insert; insert the rows one by one
+            # so only that row fails
+            print(f"Database rejected a batch of {len(batch)} generated posts, writing them one by one: {error}")
+            for row in batch:
+                await self._write([row])
+            return
+
+        for row in batch:
+            written = self._written.pop(row["id"])
+            del self._owners[row["id"]]
+            if written.done():
+                continue
+            if error is None:
+                written.set_result(None)
+            else:
+                written.set_exception(PostWriteError(f"Failed to store post {row['id']}: {error}"))
+                # Mark it retrieved; nobody may be waiting for this post
+                written.exception()
+        if error is not None:
+            if is_client_error(error):
+                print(f"Database rejected generated post {batch[0]['id']}: {error}")
+                self.rejected += len(batch)
+            else:
+                print(f"Dropping {len(batch)} generated posts, the database kept failing: {error}")
+                self.lost += len(batch)
+        async with self._room:
+            self._room.notify_all()
+
+    async def _insert(self, batch: List[dict]) -> Optional[Exception]:
+        """
+        Insert `batch`, retrying transient errors with backoff. Returns None
+        once stored, or the last error: at once if the database rejected the
+        rows, after max_attempts (shutdown_attempts while closing) otherwise.
+        """
+        delay = 0.1
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with span("post_write_flush"):
+                    await get_repository().insert_posts(batch)
+                self.rows += len(batch)
+                self.batches += 1
+                return None
+            except Exception as e:
+                if is_client_error(e):
+                    return e
+                self.failures += 1
+                if attempt >= (self.shutdown_attempts if self._closing else self.max_attempts):
+                    return e
+                print(f"Writing {len(batch)} generated posts failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self.buffered,
+            "max_pending": self.max_pending,
+            "rows": self.rows,
+            "batches": self.batches,
+            "rows_per_batch": round(self.rows / self.batches, 2) if self.batches else None,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "lost": self.lost,
+        }
+
+
+_post_writer: Optional[PostWriter] = None
+
+
+def get_post_writer() -> PostWriter:
+    global _post_writer
+    if _post_writer is None:
+        _post_writer = PostWriter(
+            POST_WRITE_BATCH, POST_WRITE_INTERVAL, POST_WRITE_MAX_PENDING,
+            max_attempts=POST_WRITE_ATTEMPTS, wait_timeout=POST_WRITE_WAIT_TIMEOUT
+        )
+    return _post_writer
+
+
+async def get_post(post_id: str, columns: str = "*") -> Optional[dict]:
+    """
+    Read a post, first waiting for its write-behind insert if it is still
+    buffered. A post that could not be stored is not found.
+    """
+    try:
+        await get_post_writer().flushed(post_id)
+    except PostWriteError:
+        return None
+    return await get_repository().get_post(post_id, columns)
+
+
+async def list_posts(
+    user_id: str,
+    columns: str,
+    limit: int,
+    after: Optional[Tuple[str, str]] = None,
+    posted: Optional[bool] = None
+) -> List[dict]:
+    """A page of the member's history (see `list_posts` in repository.py), including buffered posts."""
+    await get_post_writer().flushed_user(user_id)
+    return await get_repository().list_posts(user_id, columns, limit, after, posted)
+
+
+gauge("linkfluence_post_writes_buffered", "Generated posts waiting to be written.", lambda: get_post_writer().buffered)
@@ -0,0 +1,281 @@
+"""Background publishing of posts to LinkedIn.
+
+`/Post_to_linkedin/{post_id}` enqueues a job and returns right away. A pool of
+worker tasks runs each job through `post_to_linkedin`. Jobs live in the
+`publish_jobs` table and their images in PUBLISH_SPOOL_DIR, so work that was
+queued or in flight when the process stopped is picked up again on start.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import BinaryIO, List, Optional, Tuple
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from config import PUBLISH_WORKERS, PUBLISH_SPOOL_DIR, PUBLISH_DRAIN_TIMEOUT, IMAGE_PREPROCESS
+from image_processing import preprocess_image, preprocessing_available
+from metrics import span
+from linkedin import post_to_linkedin
+from repository import get_repository
+
+# Fields that are only meaningful to the worker and never returned to clients
+_INTERNAL_FIELDS = ("images", "text")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _copy_and_hash(source: BinaryIO, target: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """Copy a file and return the sha256 of its content, in a single pass."""
+    hasher = hashlib.sha256()
+    while chunk := source.read(chunk_size):
+        hasher.update(chunk)
+        target.write(chunk)
+    return hasher.hexdigest()
+
+
+class PublishQueue:
+    def __init__(self, workers: int, spool_dir: str, preprocess: bool = False, drain_timeout: float = 20.0):
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.preprocess = preprocess
+        self.drain_timeout = drain_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Workers in the middle of a job
+        self._busy: set = set()
+        self._stopping = False
+        # Keys being enqueued right now, so concurrent retries can't race past the lookup
+        self._enqueuing: dict = {}
+
+    async def start(self, resume: bool = True) -> None:
+        """
+        Start the workers. With `resume`, jobs left queued or running by a
+        previous process are picked up again; with several server workers only
+        one of them resumes, or the same job would be run by each.
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if not resume:
+            return
+        # Anything still queued or running belongs to a previous process
+        for job in await get_repository().list_unfinished_publish_jobs():
+            if job["stage"] == "creating_post":
+                # The post may already be live; retrying could publish it twice
+                await self._update(
+                    job["id"], status="failed",
+                    error="Interrupted while creating the LinkedIn post. Check LinkedIn before retrying."
+                )
+                continue
+            print(f"Resuming publish job {job['id']} ({job['status']})")
+            self._queue.put_nowait(job["id"])
+
+    async def stop(self) -> None:
+        """
+        Stop taking jobs and give the ones in flight `drain_timeout` seconds to
+        finish. Queued jobs, and any still running after that, stay in storage
+        and resume on next start.
+        """
+        self._stopping = True
+        busy = [task for task in self._tasks if task in self._busy]
+        for task in self._tasks:
+            if task not in self._busy:
+                task.cancel()
+        if busy:
+            _, unfinished = await asyncio.wait(busy, timeout=self.drain_timeout)
+            if unfinished:
+                print(f"Interrupting {len(unfinished)} publish jobs still running after {self.drain_timeout}s")
+            for task in unfinished:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(
+        self,
+        post_id: str,
+        user_id: str,
+        text: str,
+        files: Optional[List[UploadFile]],
+        idempotency_key: str
+    ) -> Tuple[dict, bool]:
+        """
+        Persist a publish job and queue it.
+
+        Returns:
+            (job, created). If a job with the same idempotency key is queued,
+            running or succeeded it is returned unchanged with created=False.
+            A failed one doesn't block a retry: it keeps its history under a
+            new key and a new job is created.
+        """
+        pending = self._enqueuing.get(idempotency_key)
+        if pending is not None:
+            return await asyncio.shield(pending), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueuing[idempotency_key] = future
+        try:
+            existing = await get_repository().find_publish_job(idempotency_key)
+            if existing and existing["status"] != "failed":
+                future.set_result(existing)
+                return existing, False
+            if existing:
+                # The key is unique; release it for the retry
+                await self._update(existing["id"], idempotency_key=f"{idempotency_key}:failed:{existing['id']}")
+
+            job_id = str(uuid.uuid4())
+            job = {
+                "id": job_id,
+                "post_id": post_id,
+                "user_id": user_id,
+                "text": text,
+                "images": await self._spool(job_id, files or []),
+                "idempotency_key": idempotency_key,
+                "status": "queued",
+                "stage": "queued",
+                "progress": {},
+                "linkedin_post_id": None,
+                "error": None,
+                "created_at": _now(),
+                "updated_at": _now(),
+            }
+            job = await get_repository().create_publish_job(job)
+            future.set_result(job)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved: it is re-raised here and there may be no other waiter
+            future.exception()
+            raise
+        finally:
+            del self._enqueuing[idempotency_key]
+
+        self._queue.put_nowait(job_id)
+        return job, True
+
+    async def _spool(self, job_id: str, files: List[UploadFile]) -> List[dict]:
+        """Copy uploads to disk so the job outlives the request (and the process)."""
+        if not files:
+            return []
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        images = []
+        for index, upload in enumerate(files):
+            path = os.path.join(job_dir, str(index))
+            await upload.seek(0)
+            with open(path, "wb") as target:
+                # Hashed on the way through, so a repeated image can reuse its LinkedIn asset
+                digest = await run_in_threadpool(_copy_and_hash, upload.file, target)
+            images.append({
+                "path": path,
+                "filename": upload.filename,
+                "content_type": upload.content_type,
+                "size": os.path.getsize(path),
+                "sha256": digest,
+            })
+        return images
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            job_id = await self._queue.get()
+            self._busy.add(asyncio.current_task())
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Publish job {job_id} crashed: {e}")
+                await self._update(job_id, status="failed", error=str(e))
+                self._cleanup(job_id)
+            finally:
+                self._busy.discard(asyncio.current_task())
+                self._queue.task_done()
+
+    async def _update(self, job_id: str, **values) -> None:
+        await get_repository().update_publish_job(job_id, {**values, "updated_at": _now()})
+
+    async def _run(self, job_id: str) -> None:
+        job = await get_repository().get_publish_job(job_id)
+        if not job or job["status"] not in ("queued", "running"):
+            return
+
+        await self._update(job_id, status="running")
+
+        async def on_progress(stage: str, details: dict) -> None:
+            await self._update(job_id, stage=stage, progress=details)
+
+        if self.preprocess and any(not image.get("preprocessed") for image in job["images"]):
+            await on_progress("preprocessing_images", {"total": len(job["images"])})
+            job["images"] = await self._preprocess(job["images"])
+            await self._update(job_id, images=job["images"])
+
+        files = [
+            UploadFile(
+                open(image["path"], "rb"),
+                size=image["size"],
+                filename=image["filename"],
+                headers=Headers({"content-type": image["content_type"] or "application/octet-stream"}),
+            )
+            for image in job["images"]
+        ]
+        try:
+            result = await post_to_linkedin(
+                user_id=job["user_id"], text=job["text"], image_files=files or None, on_progress=on_progress,
+                image_hashes=[image.get("sha256") for image in job["images"]]
+            )
+        finally:
+            for upload in files:
+                await upload.close()
+
+        if "error" in result:
+            print(f"Publish job {job_id} failed: {result['error']}")
+            await self._update(job_id, status="failed", error=result["error"])
+        else:
+            await get_repository().update_post(job["post_id"], {
+                "posted": True,
+                "post_id": result["post_id"]
+            })
+            await self._update(job_id, status="succeeded", stage="done", linkedin_post_id=result["post_id"])
+
+        self._cleanup(job_id)
+
+    async def _preprocess(self, images: List[dict]) -> List[dict]:
+        """Shrink the spooled images in the process pool; failures keep the original."""
+        async def one(image: dict) -> dict:
+            if image.get("preprocessed"):
+                return image
+            try:
+                with span("image_preprocess"):
+                    shrunk = await preprocess_image(image["path"])
+            except Exception as e:
+                print(f"Image preprocessing failed for {image['filename']}: {e}")
+                shrunk = None
+            return {**image, **(shrunk or {}), "preprocessed": True}
+
+        return list(await asyncio.gather(*(one(image) for image in images)))
+
+    def _cleanup(self, job_id: str) -> None:
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+
+
+def public_job(job: dict) -> dict:
+    """Job fields safe to return to clients."""
+    return {key: value for key, value in job.items() if key not in _INTERNAL_FIELDS}
+
+
+_publish_queue: Optional[PublishQueue] = None
+
+
+def get_publish_queue() -> PublishQueue:
+    global _publish_queue
+    if _publish_queue is None:
+        _publish_queue = PublishQueue(
+            workers=PUBLISH_WORKERS,
+            spool_dir=PUBLISH_SPOOL_DIR,
+            preprocess=IMAGE_PREPROCESS and preprocessing_available(),
+            drain_timeout=PUBLISH_DRAIN_TIMEOUT
+        )
+    return _publish_queue
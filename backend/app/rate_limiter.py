@@ -0,0 +1,280 @@
+"""Client-side throttling for LinkedIn API calls.
+
+LinkedIn enforces separate limits per member (access token) and per
+application. Every outgoing call waits for a token from both the member's
+bucket and the app-wide bucket, so bursts are queued and spread out instead
+of being rejected. A 429 pauses that member for the `Retry-After` period and
+cuts the rate of both buckets. Successful calls slowly raise the rate back
+to the configured maximum (AIMD), so the limiter settles just under whatever
+quota LinkedIn is actually enforcing.
+
+With a shared state backend (see shared_state.py) the buckets' tokens and
+pauses live there, so all worker processes draw from the same buckets. The
+rate each worker refills at still adapts from the 429s it sees itself.
+Without one, every worker gets an equal share of the limits.
+"""
+
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+import httpx
+from cachetools import TTLCache
+from metrics import observe, span
+from config import (
+    LINKEDIN_APP_RATE, LINKEDIN_APP_BURST,
+    LINKEDIN_MEMBER_RATE, LINKEDIN_MEMBER_BURST,
+    LINKEDIN_THROTTLE_RETRIES, WEB_WORKERS,
+)
+from shared_state import get_shared_state
+
+
+class RateLimitedError(Exception):
+    """Raised when LinkedIn keeps answering 429 after all retries."""
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        min_rate: Optional[float] = None,
+        increase: float = 0.1,
+        decrease: float = 0.7,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.capacity = capacity
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._increased_at = self._updated
+        self._decreased_at = float("-inf")
+        # asyncio.Lock wakes waiters in arrival order, which makes the queue FIFO
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Wait until a token is available and take it. Returns the time spent waiting."""
+        start = self._clock()
+        async with self._lock:
+            refilled = False
+            while True:
+                now = self._clock()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                    refilled = False
+                elif self.tokens >= 1 or refilled:
+                    # After sleeping for the refill the token is ours, even if rounding
+                    # left it a hair short: waiting for the rest may never move the clock
+                    self.tokens = max(0.0, self.tokens - 1)
+                    return self._clock() - start
+                else:
+                    delay = (1 - self.tokens) / self.rate
+                    refilled = True
+                await asyncio.sleep(delay)
+
+    def on_success(self) -> None:
+        # Additive increase of `increase * max_rate` per second since the last adjustment
+        now = self._clock()
+        self.rate = min(self.max_rate, self.rate + self.max_rate * self.increase * (now - self._increased_at))
+        self._increased_at = now
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        now = self._clock()
+        # Concurrent requests hit by the same overload all come back as 429s;
+        # back off once per second for them rather than once each.
+        if now - self._decreased_at >= 1.0:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._decreased_at = now
+        if retry_after is not None:
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + retry_after)
+            # No burst of saved-up tokens the moment the pause ends
+            self.tokens = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "paused_for": round(max(0.0, self._paused_until - self._clock()), 3),
+        }
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose tokens and pause are kept in the shared state under
+    `key`. If the shared state can't be reached, it falls back to the local
+    bucket state until it can.
+    """
+
+    def __init__(self, state, key: str, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        super().__init__(rate, capacity, clock=clock)
+        self._state = state
+        self.key = key
+        # A 429's Retry-After, passed on to the shared bucket with the next take
+        self._pause = 0.0
+
+    async def acquire(self) -> float:
+        start = self._clock()
+        async with self._lock:
+            while True:
+                try:
+                    delay = await self._state.take_token(self.key, self.rate, self.capacity, self._pause)
+                except Exception as e:
+                    print(f"Shared rate limit bucket {self.key} unavailable, using the local one: {e}")
+                    break
+                self._pause = 0.0
+                if delay <= 0:
+                    return self._clock() - start
+                await asyncio.sleep(delay)
+        await super().acquire()
+        return self._clock() - start
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        super().on_throttled(retry_after)
+        if retry_after is not None:
+            self._pause = max(self._pause, retry_after)
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class LinkedInRateLimiter:
+    def __init__(
+        self,
+        app_rate: float,
+        app_burst: float,
+        member_rate: float,
+        member_burst: float,
+        max_retries: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+        state=None
+    ):
+        # Buckets are kept in `state` if it is shared between processes
+        self._state = state if state is not None and state.shared else None
+        self._clock = clock
+        self.app = self._bucket("app", app_rate, app_burst)
+        self.member_rate = member_rate
+        self.member_burst = member_burst
+        self.max_retries = max_retries
+        # Buckets of members that stop posting are dropped after an hour
+        self._members = TTLCache(maxsize=10000, ttl=3600, timer=clock)
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _bucket(self, key: str, rate: float, capacity: float) -> TokenBucket:
+        if self._state is None:
+            return TokenBucket(rate, capacity, clock=self._clock)
+        return SharedTokenBucket(self._state, key, rate, capacity, clock=self._clock)
+
+    def member(self, access_token: str) -> TokenBucket:
+        bucket = self._members.get(access_token)
+        if bucket is None:
+            # Keyed by a hash, so bucket keys don't reveal the token (TokenCache does store
+            # tokens in the shared state; see token_cache.py)
+            key = "member:" + hashlib.sha256(access_token.encode()).hexdigest()[:32]
+            bucket = self._bucket(key, self.member_rate, self.member_burst)
+        # Re-set on every use so active members stay in the cache
+        self._members[access_token] = bucket
+        return bucket
+
+    async def request(
+        self,
+        access_token: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+        stage: str = "linkedin_request"
+    ) -> httpx.Response:
+        """
+        Run `send` once both buckets allow it, retrying after 429s.
+
+        `send` must build a new request each time it is called, since it may
+        be called again after a 429. Each call is timed as `stage`; time spent
+        queued in the buckets is timed separately as linkedin_throttle_wait.
+
+        Raises:
+            RateLimitedError: if LinkedIn still answers 429 after max_retries
+        """
+        member = self.member(access_token)
+        for attempt in range(self.max_retries + 1):
+            waited = await member.acquire() + await self.app.acquire()
+            self.waited += waited
+            if waited:
+                observe("linkedin_throttle_wait", waited)
+            self.requests += 1
+            with span(stage):
+                response = await send()
+
+            if response.status_code != 429:
+                member.on_success()
+                self.app.on_success()
+                return response
+
+            self.throttled += 1
+            retry_after = parse_retry_after(response.headers.get("retry-after"), default=2.0 ** attempt)
+            print(f"LinkedIn throttled request (attempt {attempt + 1}), retrying in {retry_after:.1f}s")
+            # The pause is per member; the app-wide rate only slows down
+            member.on_throttled(retry_after)
+            self.app.on_throttled()
+
+        raise RateLimitedError("LinkedIn rate limit reached. Please try again later.")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited, 3),
+            "app": self.app.stats(),
+            "members": len(self._members),
+            "shared": self._state is not None,
+        }
+
+
+_rate_limiter: Optional[LinkedInRateLimiter] = None
+
+
+def get_rate_limiter() -> LinkedInRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        state = get_shared_state()
+        # Workers that don't share buckets each get an equal share of the limits
+        share = 1 if state.shared else max(1, WEB_WORKERS)
+        _rate_limiter = LinkedInRateLimiter(
+            app_rate=LINKEDIN_APP_RATE / share,
+            app_burst=max(1.0, LINKEDIN_APP_BURST / share),
+            member_rate=LINKEDIN_MEMBER_RATE / share,
+            member_burst=max(1.0, LINKEDIN_MEMBER_BURST / share),
+            max_retries=LINKEDIN_THROTTLE_RETRIES,
+            state=state,
+        )
+    return _rate_limiter
+
+
+def set_rate_limiter(rate_limiter: LinkedInRateLimiter) -> None:
+    """Swap the limiter, e.g. for one with different limits in benchmarks."""
+    global _rate_limiter
+    _rate_limiter = rate_limiter
@@ -0,0 +1,353 @@
+"""Async data access for the `users`, `generated_posts` and `publish_jobs` tables.
+
+Handlers go through `get_repository()` instead of a module-level Supabase client.
+In production this is a SupabaseRepository backed by Supabase's async client,
+so database round trips no longer block the event loop. InMemoryRepository
+implements the same methods over plain dicts for tests and benchmarks.
+"""
+
+import asyncio
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from supabase import acreate_client, AsyncClient
+from postgrest.exceptions import APIError
+from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SLOW_CALL
+from metrics import span
+from circuit_breaker import get_breaker
+
+# generated_posts columns a caller may select; anything else is rejected
+POST_COLUMNS = (
+    "id", "user_id", "created_at", "posted", "post_id", "length", "tone", "note",
+    "scheduled_at", "parent_id", "version", "instruction", "generated_text", "original_text",
+)
+
+
+# SQLSTATE classes, and PostgREST codes, that mean the database or the connection to it is in trouble
+_TRANSIENT_SQLSTATES = ("08", "40", "53", "57", "58", "XX")
+_TRANSIENT_POSTGREST_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+
+def is_client_error(error: BaseException) -> bool:
+    """
+    True if PostgREST rejected the request itself (invalid uuid, constraint
+    violation, unknown column, ...). The database is fine and retrying the
+    same request won't help.
+    """
+    if not isinstance(error, APIError):
+        return False
+    code = str(error.code or "")
+    if code.isdigit() and len(code) == 3:
+        # An HTTP status: the response body wasn't a PostgREST error
+        return int(code) < 500
+    if not code or code in _TRANSIENT_POSTGREST_CODES:
+        return False
+    return code.startswith("PGRST") or not code.startswith(_TRANSIENT_SQLSTATES)
+
+
+def encode_cursor(post: dict) -> str:
+    """Opaque keyset cursor pointing just past `post` in a user's history."""
+    key = json.dumps([post["created_at"], post["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (created_at, id) from `encode_cursor`. Raises ValueError if it is
+    malformed; both values go into a PostgREST filter, so they are validated.
+    """
+    try:
+        created_at, post_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        datetime.fromisoformat(created_at)
+        return str(created_at), str(uuid.UUID(post_id))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class SupabaseRepository:
+    def __init__(self, url: str = SUPABASE_URL, key: str = SUPABASE_KEY):
+        self._url = url
+        self._key = key
+        self._client: Optional[AsyncClient] = None
+        self._lock = asyncio.Lock()
+
+    async def _db(self) -> AsyncClient:
+        # The async client can only be created inside a running loop
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._client = await acreate_client(self._url, self._key)
+        return self._client
+
+    @staticmethod
+    async def _execute(stage: str, query):
+        # Every query goes through the Supabase breaker, so an outage fails fast.
+        # Requests PostgREST rejects (bad input, constraint violations) don't count against it.
+        with span(stage):
+            return await get_breaker("supabase", SUPABASE_SLOW_CALL).call(query.execute, ignore_error=is_client_error)
+
+    async def get_access_token(self, linkedin_id: str) -> Optional[str]:
+        db = await self._db()
+        res = await self._execute("db_select", db.table("users").select("access_token").eq("linkedin_id", linkedin_id))
+        return res.data[0]["access_token"] if res.data else None
+
+    async def save_user(self, linkedin_id: str, name: str, email: str, access_token: str) -> dict:
+        """Insert or update the member in one atomic upsert on linkedin_id."""
+        db = await self._db()
+        row = {"linkedin_id": linkedin_id, "name": name, "email": email, "access_token": access_token}
+        result = await self._execute("db_upsert", db.table("users").upsert(row, on_conflict="linkedin_id"))
+        return result.data[0] if result.data else {}
+
+    async def get_post(self, post_id: str, columns: str = "*") -> Optional[dict]:
+        """One post, with only `columns` (comma-separated, as in `select`)."""
+        db = await self._db()
+        res = await self._execute("db_select", db.table("generated_posts").select(columns).eq("id", post_id))
+        return res.data[0] if res.data else None
+
+    async def list_posts(
+        self,
+        user_id: str,
+        columns: str,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+        posted: Optional[bool] = None
+    ) -> List[dict]:
+        """
+        A page of the member's posts, newest first, ordered by (created_at, id).
+
+        `after` is the (created_at, id) of the last post of the previous page.
+        Paging seeks on the (user_id, created_at, id) index instead of using
+        an offset, so a page costs the same however deep into the history it is.
+        """
+        db = await self._db()
+        query = db.table("generated_posts").select(columns).eq("user_id", user_id)
+        if posted is not None:
+            query = query.eq("posted", posted)
+        if after:
+            created_at, post_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{post_id})'
+            )
+        res = await self._execute(
+            "db_select",
+            query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+        )
+        return res.data
+
+    async def insert_post(self, row: dict) -> dict:
+        db = await self._db()
+        res = await self._execute("db_insert", db.table("generated_posts").insert(row))
+        return res.data[0]
+
+    async def insert_posts(self, rows: List[dict]) -> List[dict]:
+        """Bulk insert in a single round trip. Returned rows keep the input order."""
+        if not rows:
+            return []
+        db = await self._db()
+        res = await self._execute("db_insert", db.table("generated_posts").insert(rows))
+        return res.data
+
+    async def update_post(self, post_id: str, values: dict) -> None:
+        db = await self._db()
+        await self._execute("db_update", db.table("generated_posts").update(values).eq("id", post_id))
+
+    async def list_scheduled_posts(self, until: str, limit: int) -> List[dict]:
+        """Unposted posts scheduled at or before `until`, earliest first."""
+        db = await self._db()
+        res = await self._execute(
+            "db_select",
+            db.table("generated_posts")
+            .select("id, scheduled_at")
+            .lte("scheduled_at", until)
+            .eq("posted", False)
+            .order("scheduled_at")
+            .limit(limit)
+        )
+        return res.data
+
+    async def create_publish_job(self, job: dict) -> dict:
+        db = await self._db()
+        res = await self._execute("db_insert", db.table("publish_jobs").insert(job))
+        return res.data[0]
+
+    async def get_publish_job(self, job_id: str) -> Optional[dict]:
+        db = await self._db()
+        res = await self._execute("db_select", db.table("publish_jobs").select("*").eq("id", job_id))
+        return res.data[0] if res.data else None
+
+    async def find_publish_job(self, idempotency_key: str) -> Optional[dict]:
+        db = await self._db()
+        res = await self._execute("db_select", db.table("publish_jobs").select("*").eq("idempotency_key", idempotency_key))
+        return res.data[0] if res.data else None
+
+    async def update_publish_job(self, job_id: str, values: dict) -> None:
+        db = await self._db()
+        await self._execute("db_update", db.table("publish_jobs").update(values).eq("id", job_id))
+
+    async def list_unfinished_publish_jobs(self) -> List[dict]:
+        db = await self._db()
+        res = await self._execute("db_select", db.table("publish_jobs").select("*").in_("status", ["queued", "running"]).order("created_at"))
+        return res.data
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.postgrest.aclose()
+            self._client = None
+
+
+class InMemoryRepository:
+    """
+    Drop-in test double for SupabaseRepository.
+
+    `latency` adds a simulated round trip (in seconds) to every call, which
+    lets benchmarks model a remote database without blocking the loop.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.users: dict = {}
+        self.posts: dict = {}
+        self.publish_jobs: dict = {}
+
+    async def _round_trip(self, stage: str) -> None:
+        # Timed like the Supabase calls, so benchmarks report the same stages
+        with span(stage):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+    async def get_access_token(self, linkedin_id: str) -> Optional[str]:
+        await self._round_trip("db_select")
+        user = self.users.get(linkedin_id)
+        return user["access_token"] if user else None
+
+    async def save_user(self, linkedin_id: str, name: str, email: str, access_token: str) -> dict:
+        await self._round_trip("db_upsert")
+        user = self.users.setdefault(linkedin_id, {"id": str(uuid.uuid4()), "linkedin_id": linkedin_id})
+        user.update({"name": name, "email": email, "access_token": access_token})
+        return dict(user)
+
+    @staticmethod
+    def _project(row: dict, columns: str) -> dict:
+        if columns.strip() == "*":
+            return dict(row)
+        return {name: row.get(name) for name in (c.strip() for c in columns.split(","))}
+
+    async def get_post(self, post_id: str, columns: str = "*") -> Optional[dict]:
+        await self._round_trip("db_select")
+        post = self.posts.get(post_id)
+        return self._project(post, columns) if post else None
+
+    async def list_posts(
+        self,
+        user_id: str,
+        columns: str,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+        posted: Optional[bool] = None
+    ) -> List[dict]:
+        await self._round_trip("db_select")
+        key = lambda p: (datetime.fromisoformat(p["created_at"]), p["id"])
+        posts = [
+            p for p in self.posts.values()
+            if p["user_id"] == user_id and (posted is None or p["posted"] == posted)
+        ]
+        if after:
+            bound = (datetime.fromisoformat(after[0]), after[1])
+            posts = [p for p in posts if key(p) < bound]
+        posts.sort(key=key, reverse=True)
+        return [self._project(p, columns) for p in posts[:limit]]
+
+    def _store_post(self, row: dict) -> dict:
+        post = {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "posted": False,
+            "post_id": None,
+            "scheduled_at": None,
+            "parent_id": None,
+            "version": 1,
+            **row,
+        }
+        self.posts[post["id"]] = post
+        return dict(post)
+
+    async def insert_post(self, row: dict) -> dict:
+        await self._round_trip("db_insert")
+        return self._store_post(row)
+
+    async def insert_posts(self, rows: List[dict]) -> List[dict]:
+        if not rows:
+            return []
+        await self._round_trip("db_insert")
+        return [self._store_post(row) for row in rows]
+
+    async def update_post(self, post_id: str, values: dict) -> None:
+        await self._round_trip("db_update")
+        if post_id in self.posts:
+            self.posts[post_id].update(values)
+
+    async def list_scheduled_posts(self, until: str, limit: int) -> List[dict]:
+        await self._round_trip("db_select")
+        due = [
+            p for p in self.posts.values()
+            if p["scheduled_at"] and not p["posted"]
+            and datetime.fromisoformat(p["scheduled_at"]) <= datetime.fromisoformat(until)
+        ]
+        due.sort(key=lambda p: datetime.fromisoformat(p["scheduled_at"]))
+        return [{"id": p["id"], "scheduled_at": p["scheduled_at"]} for p in due[:limit]]
+
+    async def create_publish_job(self, job: dict) -> dict:
+        await self._round_trip("db_insert")
+        if any(j["idempotency_key"] == job["idempotency_key"] for j in self.publish_jobs.values()):
+            raise ValueError(f"Duplicate idempotency key: {job['idempotency_key']}")
+        self.publish_jobs[job["id"]] = dict(job)
+        return dict(job)
+
+    async def get_publish_job(self, job_id: str) -> Optional[dict]:
+        await self._round_trip("db_select")
+        job = self.publish_jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def find_publish_job(self, idempotency_key: str) -> Optional[dict]:
+        await self._round_trip("db_select")
+        for job in self.publish_jobs.values():
+            if job["idempotency_key"] == idempotency_key:
+                return dict(job)
+        return None
+
+    async def update_publish_job(self, job_id: str, values: dict) -> None:
+        await self._round_trip("db_update")
+        if job_id in self.publish_jobs:
+            self.publish_jobs[job_id].update(values)
+
+    async def list_unfinished_publish_jobs(self) -> List[dict]:
+        await self._round_trip("db_select")
+        jobs = [j for j in self.publish_jobs.values() if j["status"] in ("queued", "running")]
+        return [dict(j) for j in sorted(jobs, key=lambda j: j["created_at"])]
+
+    async def close(self) -> None:
+        pass
+
+
+_repository = None
+
+
+def get_repository():
+    """Return the process-wide repository, creating the Supabase one on first use."""
+    global _repository
+    if _repository is None:
+        _repository = SupabaseRepository()
+    return _repository
+
+
+def set_repository(repository) -> None:
+    """Swap the repository, e.g. for InMemoryRepository in tests and benchmarks."""
+    global _repository
+    _repository = repository
+
+
+async def close_repository() -> None:
+    if _repository is not None:
+        await _repository.close()
@@ -0,0 +1,200 @@
+"""Publishing of posts at a scheduled time.
+
+A post is scheduled by setting `generated_posts.scheduled_at`. The scheduler
+keeps only the posts due within the next SCHEDULER_HORIZON seconds in memory,
+as a min-heap of (due, post_id) tuples, and sleeps until the earliest one is
+due. Scheduling or cancelling through this process wakes it up. Otherwise the
+database is only read once per horizon, so weeks of queued posts cost a single
+indexed range query each time the window moves on, not a poll every second.
+
+Due posts go through the publish queue, so they get the same retries,
+progress tracking and idempotency as a manual publish.
+
+With several server workers the scheduler runs in one of them only (the one
+that resumes publish jobs). Posts scheduled through the others are only
+seen when it reads the window again, so it then does that every
+SCHEDULER_REFRESH seconds instead of once per horizon.
+"""
+
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from config import SCHEDULER_HORIZON, SCHEDULER_LOAD_LIMIT, SCHEDULER_REFRESH, WEB_WORKERS
+from publish_queue import get_publish_queue
+from repository import get_repository
+
+
+def to_timestamp(value: str) -> float:
+    """Seconds since the epoch for a stored ISO 8601 `scheduled_at`."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def to_iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class PostScheduler:
+    def __init__(
+        self,
+        horizon: float = 300.0,
+        load_limit: int = 1000,
+        retry_delay: float = 30.0,
+        refresh: Optional[float] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.horizon = horizon
+        self.load_limit = load_limit
+        self.retry_delay = retry_delay
+        # Seconds between reads of the window, for changes made by other processes
+        self.refresh = horizon if refresh is None else min(refresh, horizon)
+        self._clock = clock
+        self._heap: List[Tuple[float, str]] = []
+        # post_id -> due time of its live heap entry; anything else in the heap is stale
+        self._pending: Dict[str, float] = {}
+        # Every post due before this time is in the heap (or was dispatched)
+        self._loaded_until = float("-inf")
+        self._next_refresh = float("-inf")
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def schedule(self, post_id: str, publish_at: datetime) -> str:
+        """Store the publish time for a post and return it as stored."""
+        if publish_at.tzinfo is None:
+            publish_at = publish_at.replace(tzinfo=timezone.utc)
+        scheduled_at = publish_at.astimezone(timezone.utc).isoformat()
+        await get_repository().update_post(post_id, {"scheduled_at": scheduled_at})
+        self._track(post_id, publish_at.timestamp())
+        return scheduled_at
+
+    async def unschedule(self, post_id: str) -> None:
+        await get_repository().update_post(post_id, {"scheduled_at": None})
+        # The heap entry goes stale and is dropped when it surfaces
+        self._pending.pop(post_id, None)
+
+    def _track(self, post_id: str, due: float) -> None:
+        self._pending.pop(post_id, None)
+        if due > self._loaded_until:
+            # Outside the loaded window: the reload that reaches it will pick it up
+            return
+        self._push(post_id, due)
+        self._wakeup.set()
+
+    def _push(self, post_id: str, due: float) -> None:
+        self._pending[post_id] = due
+        heapq.heappush(self._heap, (due, post_id))
+
+    async def _reload(self, now: float) -> None:
+        until = now + self.horizon
+        rows = await get_repository().list_scheduled_posts(until=to_iso(until), limit=self.load_limit)
+        for row in rows:
+            due = to_timestamp(row["scheduled_at"])
+            # New, or moved by another process; a moved post's old entry goes stale
+            if self._pending.get(row["id"]) != due:
+                self._push(row["id"], due)
+        # A full page may have left later posts in the window behind; stop the window at the last one
+        self._loaded_until = to_timestamp(rows[-1]["scheduled_at"]) if len(rows) >= self.load_limit else until
+        self._next_refresh = now + self.refresh
+
+    async def run_due(self) -> int:
+        """Dispatch every post due at the current clock time. Returns how many were dispatched."""
+        now = self._clock()
+        if now >= min(self._loaded_until, self._next_refresh):
+            await self._reload(now)
+
+        dispatched = 0
+        while self._heap and self._heap[0][0] <= now:
+            due, post_id = heapq.heappop(self._heap)
+            if self._pending.get(post_id) != due:
+                continue
+            del self._pending[post_id]
+            try:
+                if await self._dispatch(post_id):
+                    dispatched += 1
+            except Exception as e:
+                print(f"Scheduled publish of post {post_id} failed: {e}")
+                self.failed += 1
+                self._push(post_id, now + self.retry_delay)
+        self.dispatched += dispatched
+        return dispatched
+
+    async def _dispatch(self, post_id: str) -> bool:
+        post = await get_repository().get_post(post_id, "user_id, generated_text, posted, scheduled_at")
+        # Posted, cancelled or moved since it was loaded
+        if not post or post["posted"] or not post.get("scheduled_at"):
+            return False
+        if to_timestamp(post["scheduled_at"]) > self._clock():
+            self._track(post_id, to_timestamp(post["scheduled_at"]))
+            return False
+
+        await get_publish_queue().enqueue(
+            post_id=post_id,
+            user_id=post["user_id"],
+            text=post["generated_text"],
+            files=None,
+            # Re-dispatching after a crash maps to the job created the first time
+            idempotency_key=f"scheduled:{post_id}:{post['scheduled_at']}"
+        )
+        await get_repository().update_post(post_id, {"scheduled_at": None})
+        return True
+
+    def next_wakeup(self) -> float:
+        """Clock time of the next due post or window reload, whichever is first."""
+        reload_at = min(self._loaded_until, self._next_refresh)
+        if self._heap:
+            return min(self._heap[0][0], reload_at)
+        return reload_at
+
+    async def _loop(self) -> None:
+        while True:
+            # Cleared before running so a schedule() during run_due still wakes us
+            self._wakeup.clear()
+            try:
+                await self.run_due()
+            except Exception as e:
+                print(f"Scheduler reload failed: {e}")
+                await asyncio.sleep(self.retry_delay)
+                continue
+            delay = max(0.0, self.next_wakeup() - self._clock())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "heap_size": len(self._heap),
+            "loaded_until": to_iso(self._loaded_until) if self._loaded_until != float("-inf") else None,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+        }
+
+
+_scheduler: Optional[PostScheduler] = None
+
+
+def get_scheduler() -> PostScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PostScheduler(
+            horizon=SCHEDULER_HORIZON,
+            load_limit=SCHEDULER_LOAD_LIMIT,
+            refresh=SCHEDULER_REFRESH if WEB_WORKERS > 1 else None
+        )
+    return _scheduler
@@ -0,0 +1,159 @@
+"""Production entry point: several uvicorn worker processes on one port.
+
+    cd backend/app && python server.py --workers 4 --port 4000
+
+The app is imported once here, in the parent process, which then binds the
+socket and forks the workers; they share the socket and the kernel spreads
+connections between them. FastAPI, LangChain and the Supabase client take
+seconds to import, and every worker starts with them already loaded (and
+their memory shared copy-on-write) instead of importing them again.
+
+Nothing that holds a connection is created at import time: the HTTP client is
+opened by each worker's lifespan, and the Supabase, LLM and Redis clients on
+first use, so every worker gets its own after the fork. Workers use uvloop and
+httptools when they are installed. One that dies is replaced, and SIGINT or
+SIGTERM shuts them all down gracefully.
+
+Caches and LinkedIn rate limits are per worker unless SHARED_STATE_URL points
+at Redis (see shared_state.py). Only the first worker resumes the publish jobs
+left unfinished by a previous run and dispatches scheduled posts. LLM admission
+limits and /metrics are per worker.
+
+Where fork isn't available (Windows) a single worker is run.
+"""
+
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+import config
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, index: int, resume: bool, on_worker_start) -> None:
+    import uvicorn
+
+    app.state.resume_publish_jobs = resume
+    # Kept by a restarted first worker, or nobody would dispatch scheduled posts
+    app.state.run_scheduler = index == 0
+    if on_worker_start:
+        on_worker_start(index)
+    server = uvicorn.Server(uvicorn.Config(app, loop="auto", http="auto", lifespan="on", log_level="warning"))
+    server.run(sockets=[sock])
+
+
+def serve(
+    app,
+    host: str,
+    port: int,
+    workers: int,
+    on_worker_start: Optional[Callable[[int], None]] = None
+) -> None:
+    """
+    Serve `app` from `workers` forked processes until SIGINT/SIGTERM.
+
+    `on_worker_start(index)` runs in each worker right after the fork, before
+    the app starts (benchmarks use it to install stand-ins).
+    """
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+
+    if not hasattr(os, "fork"):
+        import uvicorn
+
+        print(f"No fork() on this platform, serving with one worker on {host}:{port}")
+        if on_worker_start:
+            on_worker_start(0)
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    sock = _bind(host, port)
+    print(f"Serving on {host}:{port} with {workers} workers ({loop}, {http})")
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int, resume: bool) -> None:
+        # Or the child would print whatever the parent still has buffered again
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                _run_worker(app, sock, index, resume, on_worker_start)
+            except BaseException as e:
+                print(f"Worker {index} failed: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(workers):
+        spawn(index, resume=index == 0)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}, restarting it")
+        # Don't spin if workers die right away, e.g. on a config error
+        time.sleep(1)
+        # Jobs the dead worker was running stay "running" until the next full restart,
+        # since the others may still be running theirs
+        spawn(index, resume=False)
+    sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS") or os.cpu_count() or 1),
+                        help="worker processes (default: WEB_WORKERS, or one per CPU)")
+    parser.add_argument("--host", default=config.WEB_HOST)
+    parser.add_argument("--port", type=int, default=config.WEB_PORT)
+    args = parser.parse_args()
+
+    # Read by modules that split per-process limits between workers, so set it before they are imported
+    config.WEB_WORKERS = args.workers
+    # Preload: everything is imported once here, before the fork
+    from main import app
+
+    serve(app, args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
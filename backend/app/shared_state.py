@@ -0,0 +1,255 @@
+"""Cache and rate-limit state that can be shared by the server's worker processes.
+
+The token, asset and generation caches keep their entries in a Store from
+`get_shared_state()` (the first two through SharedCache), and the LinkedIn
+rate limiter keeps its buckets there when the state is shared. SHARED_STATE_URL picks the backend:
+
+    memory://              MemoryState, per process (the default). With several
+                           workers each one has its own caches, and the
+                           LinkedIn limits are split evenly between them.
+    redis://host:6379/0    RedisState, any Redis-compatible server. All workers
+                           see the same cache entries and draw from the same
+                           LinkedIn rate limit buckets.
+
+The Redis client is created on first use, inside the worker that uses it, so
+nothing is shared across a fork. Redis calls go through the "shared_state"
+circuit breaker; while Redis is unreachable the caches behave as if empty and
+the rate limiter falls back to per-process buckets, so requests still go
+through. The redis package is only needed for the Redis backend.
+"""
+
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional
+from cachetools import TTLCache
+from config import SHARED_STATE_URL, SHARED_STATE_PREFIX, SHARED_STATE_TIMEOUT
+from circuit_breaker import CircuitOpenError, get_breaker
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+
+class MemoryStore:
+    """A TTL + LRU cache namespace in this process."""
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any) -> None:
+        self._cache[key] = value
+
+    async def delete(self, key: str) -> None:
+        self._cache.pop(key, None)
+
+    async def clear(self) -> None:
+        self._cache.clear()
+
+    def size(self) -> Optional[int]:
+        return self._cache.currsize
+
+
+class MemoryState:
+    shared = False
+
+    def store(self, namespace: str, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic) -> MemoryStore:
+        return MemoryStore(maxsize, ttl, timer)
+
+    async def close(self) -> None:
+        pass
+
+
+# Takes a token from the bucket at KEYS[1], or says how long to wait for one.
+# The refill uses Redis' clock, so workers never disagree about elapsed time.
+# ARGV: rate (tokens/second), capacity, and a pause in seconds (after a 429) or 0.
+_TAKE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local pause = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'paused_until')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+local paused_until = tonumber(state[3]) or 0
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+if pause > 0 then
+  paused_until = math.max(paused_until, now + pause)
+  tokens = 0
+end
+local delay = 0
+if now < paused_until then
+  delay = paused_until - now
+elseif tokens >= 1 then
+  tokens = tokens - 1
+else
+  delay = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now, 'paused_until', paused_until)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(delay)
+"""
+
+
+class RedisStore:
+    """A cache namespace in Redis. Values are stored as JSON and expire after `ttl`."""
+
+    def __init__(self, state: "RedisState", namespace: str, maxsize: int, ttl: float):
+        self._state = state
+        self._prefix = f"{state.prefix}{namespace}:"
+        # Redis evicts by its own maxmemory policy; maxsize is only reported
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self._state.call(lambda client: client.get(self._prefix + key))
+        except Exception as e:
+            self._state.failed("get", e)
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        try:
+            await self._state.call(lambda client: client.set(self._prefix + key, payload, px=max(1, int(self.ttl * 1000))))
+        except Exception as e:
+            self._state.failed("set", e)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self._state.call(lambda client: client.delete(self._prefix + key))
+        except Exception as e:
+            self._state.failed("delete", e)
+
+    async def clear(self) -> None:
+        client = self._state.client()
+        async for key in client.scan_iter(match=self._prefix + "*", count=500):
+            await client.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class RedisState:
+    shared = True
+
+    def __init__(self, url: str, prefix: str = SHARED_STATE_PREFIX):
+        if redis is None:
+            raise RuntimeError(f"SHARED_STATE_URL={url} needs the redis package (pip install redis)")
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+        self._take_token = None
+
+    def client(self):
+        # Created lazily in the worker process and loop that use it
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                self.url, socket_timeout=SHARED_STATE_TIMEOUT, socket_connect_timeout=SHARED_STATE_TIMEOUT
+            )
+            self._take_token = self._client.register_script(_TAKE_TOKEN)
+        return self._client
+
+    async def call(self, command: Callable[[Any], Awaitable[Any]]) -> Any:
+        """Run `command(client)` through the shared_state circuit breaker."""
+        client = self.client()
+        return await get_breaker("shared_state", SHARED_STATE_TIMEOUT).call(lambda: command(client))
+
+    @staticmethod
+    def failed(operation: str, error: Exception) -> None:
+        # An open breaker is already reported by /health; don't log every call
+        if not isinstance(error, CircuitOpenError):
+            print(f"Shared state {operation} failed: {error}")
+
+    def store(self, namespace: str, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic) -> RedisStore:
+        return RedisStore(self, namespace, maxsize, ttl)
+
+    async def take_token(self, key: str, rate: float, capacity: float, pause: float = 0.0) -> float:
+        """Take a token from the shared bucket `key`. Returns 0, or the seconds to wait before trying again."""
+        delay = await self.call(lambda client: self._take_token(keys=[f"{self.prefix}bucket:{key}"], args=[rate, capacity, pause]))
+        return float(delay)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SharedCache:
+    """
+    Base for a cache in the shared state store: a `namespace` of entries
+    that expire after `ttl`, keyed by ":"-joined parts, with hit and miss
+    counters for /linkedin/stats.
+    """
+
+    namespace = ""
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic, state=None):
+        self._cache = (state or get_shared_state()).store(self.namespace, maxsize, ttl, timer)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(*parts: str) -> str:
+        return ":".join(parts)
+
+    async def _lookup(self, *parts: str) -> Optional[Any]:
+        value = await self._cache.get(self._key(*parts))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def invalidate(self, *parts: str) -> None:
+        await self._cache.delete(self._key(*parts))
+
+    async def clear(self) -> None:
+        await self._cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": self._cache.size(),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+        }
+
+
+def create_shared_state(url: str):
+    if url.startswith("memory:"):
+        return MemoryState()
+    if url.startswith(("redis:", "rediss:", "unix:")):
+        return RedisState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+_shared_state = None
+
+
+def get_shared_state():
+    global _shared_state
+    if _shared_state is None:
+        _shared_state = create_shared_state(SHARED_STATE_URL)
+    return _shared_state
+
+
+def set_shared_state(state) -> None:
+    """Swap the backend, e.g. for a RedisState in benchmarks."""
+    global _shared_state
+    _shared_state = state
+
+
+async def close_shared_state() -> None:
+    if _shared_state is not None:
+        await _shared_state.close()
@@ -0,0 +1,46 @@
+from typing import Optional
+from config import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
+from repository import get_repository
+from shared_state import SharedCache
+
+
+class TokenCache(SharedCache):
+    """
+    Cache of LinkedIn access tokens, keyed by LinkedIn id, in the shared
+    state store (see shared_state.py).
+
+    The OAuth callback writes new tokens through to it and a 401 from LinkedIn
+    evicts the entry (`invalidate(linkedin_id)`), so a member who posts
+    regularly reads their token from the database only once per TTL.
+
+    Tokens are cached as they are: with a Redis SHARED_STATE_URL they are
+    stored in Redis, so it needs the same protection as the users table
+    (not reachable publicly, with a password, rediss:// across networks).
+    """
+
+    namespace = "token"
+
+    async def get(self, linkedin_id: str) -> Optional[str]:
+        """Cached token for the member, loading it from the repository on a miss."""
+        token = await self._lookup(linkedin_id)
+        if token is not None:
+            return token
+
+        token = await get_repository().get_access_token(linkedin_id)
+        # Unknown members are not cached, so they work as soon as they log in
+        if token is not None:
+            await self._cache.set(linkedin_id, token)
+        return token
+
+    async def put(self, linkedin_id: str, access_token: str) -> None:
+        await self._cache.set(linkedin_id, access_token)
+
+
+_token_cache: Optional[TokenCache] = None
+
+
+def get_token_cache() -> TokenCache:
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+    return _token_cache
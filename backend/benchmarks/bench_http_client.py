@@ -0,0 +1,94 @@
+"""Connection reuse benchmark: per-request httpx clients vs the shared pooled client.
+
+Runs N concurrent publishers, each sending several text posts through
+`post_to_linkedin`, against a local TLS stand-in for api.linkedin.com and
+reports latency plus the number of TCP connections the stand-in saw.
+
+    cd backend && python benchmarks/bench_http_client.py --posts 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+PORT = int(os.getenv("BENCH_LINKEDIN_PORT", "8765"))
+os.environ["LINKEDIN_API_BASE"] = f"https://127.0.0.1:{PORT}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import linkedin  # noqa: E402
+import http_client  # noqa: E402
+from fake_linkedin import serve  # noqa: E402
+from rate_limiter import LinkedInRateLimiter, set_rate_limiter  # noqa: E402
+from repository import InMemoryRepository, set_repository  # noqa: E402
+
+
+async def run(posts: int, waves: int, shared: bool):
+    # This measures connection reuse, not client-side throttling
+    set_rate_limiter(LinkedInRateLimiter(1e9, 1e9, 1e9, 1e9))
+    fresh_clients = []
+
+    def per_request_client():
+        client = http_client.create_http_client()
+        fresh_clients.append(client)
+        return client
+
+    linkedin.get_http_client = http_client.get_http_client if shared else per_request_client
+    if shared:
+        await http_client.open_http_client()
+
+    async def one(i):
+        start = time.perf_counter()
+        result = await linkedin.post_to_linkedin(user_id=f"member{i}", text=f"post {i}")
+        assert result.get("success"), result
+        return time.perf_counter() - start
+
+    async def worker(i):
+        return [await one(i) for _ in range(waves)]
+
+    # `posts` concurrent publishers, each publishing `waves` posts back to back
+    start = time.perf_counter()
+    latencies = [lat for lats in await asyncio.gather(*(worker(i) for i in range(posts))) for lat in lats]
+    wall = time.perf_counter() - start
+
+    for client in fresh_clients:
+        await client.aclose()
+    await http_client.close_http_client()
+
+    latencies = sorted(latencies)
+    return {
+        "mode": "shared" if shared else "per_request",
+        "posts": posts * waves,
+        "wall_s": round(wall, 4),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--waves", type=int, default=5, help="posts per publisher")
+    args = parser.parse_args()
+
+    repository = InMemoryRepository()
+    for i in range(args.posts):
+        repository.users[f"member{i}"] = {"linkedin_id": f"member{i}", "access_token": "bench-token"}
+    set_repository(repository)
+    results = []
+    with serve(PORT, tls=True) as fake:
+        for shared in (False, True):
+            fake.reset()
+            with contextlib.redirect_stdout(sys.stderr):
+                result = asyncio.run(run(args.posts, args.waves, shared))
+            result["tcp_connections"] = fake.stats()["tcp_connections"]
+            results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Bytes on the wire and publish latency with and without image preprocessing.
+
+Publishes posts carrying phone-sized photos (4032x3024 JPEGs with EXIF)
+through the publish queue to a local LinkedIn stand-in whose upload link is
+limited to --uplink-mbit, once uploading the originals and once with the
+process-pool preprocessing stage enabled.
+
+    cd backend && python benchmarks/bench_image_preprocess.py --posts 4 --images 3
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+PORT = int(os.getenv("BENCH_LINKEDIN_PORT", "8770"))
+os.environ["LINKEDIN_API_BASE"] = f"http://127.0.0.1:{PORT}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from fastapi import UploadFile  # noqa: E402
+from PIL import Image  # noqa: E402
+from starlette.datastructures import Headers  # noqa: E402
+
+import http_client  # noqa: E402
+import image_processing  # noqa: E402
+from asset_cache import get_asset_cache  # noqa: E402
+from fake_linkedin import serve  # noqa: E402
+from publish_queue import PublishQueue  # noqa: E402
+from repository import InMemoryRepository, set_repository  # noqa: E402
+
+
+def phone_photo(seed: int) -> bytes:
+    """A 12MP JPEG with camera-like noise and EXIF, roughly what a phone uploads."""
+    size = (4032, 3024)
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 6 + seed % 4)
+    image = Image.merge("RGB", (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    exif = Image.Exif()
+    exif[0x0112] = 1          # Orientation
+    exif[0x010F] = "Phone"    # Make
+    exif[0x0131] = "Camera"   # Software
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+async def run(preprocess: bool, photos, posts: int, images: int) -> dict:
+    repository = InMemoryRepository()
+    await repository.save_user("member", "Bench User", "bench@example.com", "bench-token")
+    set_repository(repository)
+    await get_asset_cache().clear()
+    await http_client.open_http_client()
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        queue = PublishQueue(workers=posts, spool_dir=spool_dir, preprocess=preprocess)
+        await queue.start()
+
+        enqueued = {}
+        for p in range(posts):
+            post = await repository.insert_post({"user_id": "member", "generated_text": f"post {p}"})
+            files = [
+                UploadFile(
+                    io.BytesIO(photos[(p * images + i) % len(photos)]),
+                    size=len(photos[(p * images + i) % len(photos)]),
+                    filename=f"photo{i}.jpg",
+                    headers=Headers({"content-type": "image/jpeg"}),
+                )
+                for i in range(images)
+            ]
+            job, _ = await queue.enqueue(post["id"], "member", f"post {p}", files, idempotency_key=f"{p}")
+            enqueued[job["id"]] = time.perf_counter()
+
+        latencies = {}
+        while len(latencies) < len(enqueued):
+            for job_id, start in enqueued.items():
+                if job_id not in latencies and repository.publish_jobs[job_id]["status"] in ("succeeded", "failed"):
+                    assert repository.publish_jobs[job_id]["status"] == "succeeded", repository.publish_jobs[job_id]
+                    latencies[job_id] = time.perf_counter() - start
+            await asyncio.sleep(0.01)
+
+        await queue.stop()
+    await http_client.close_http_client()
+    image_processing.close_image_pool()
+
+    values = sorted(latencies.values())
+    return {
+        "preprocess": preprocess,
+        "posts": posts,
+        "images_per_post": images,
+        "p50_s": round(values[len(values) // 2], 2),
+        "max_s": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=4)
+    parser.add_argument("--images", type=int, default=3, help="images per post")
+    parser.add_argument("--uplink-mbit", type=float, default=20.0)
+    args = parser.parse_args()
+
+    photos = [phone_photo(seed) for seed in range(args.posts * args.images)]
+    results = []
+    with serve(PORT, latency=0.02, handshake_latency=0.0, upload_bandwidth=args.uplink_mbit * 1e6 / 8) as server:
+        for preprocess in (False, True):
+            server.reset()
+            with contextlib.redirect_stdout(sys.stderr):
+                result = asyncio.run(run(preprocess, photos, args.posts, args.images))
+            result["original_mb"] = round(sum(len(photo) for photo in photos) / 1e6, 1)
+            result["uploaded_mb"] = round(server.stats()["uploaded_bytes"] / 1e6, 1)
+            results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""LLM router benchmark with fake providers on scripted latencies.
+
+Compares always using one provider against latency-aware routing, with and
+without hedging, and reports p50/p95/p99 per strategy.
+
+    cd backend && python benchmarks/bench_llm_router.py --requests 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from fake_llm import FakeChatModel  # noqa: E402
+from llm_router import LLMRouter, Provider  # noqa: E402
+
+
+def providers():
+    # "openai": usually fast with a heavy tail, "groq": steady, "gemini": flaky
+    return [
+        Provider("openai", FakeChatModel("openai", [0.30] * 8 + [2.0, 2.5])),
+        Provider("groq", FakeChatModel("groq", [0.45, 0.50, 0.55])),
+        Provider("gemini", FakeChatModel("gemini", [0.25, None, None])),
+    ]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(strategy: str, requests: int, concurrency: int) -> dict:
+    pool = providers()
+    if strategy == "single":
+        router = LLMRouter(pool[:1])
+    elif strategy == "routed":
+        router = LLMRouter(pool)
+    else:
+        router = LLMRouter(pool, hedge_after=0.6)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await router.ainvoke(f"post {i}")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return {
+        "strategy": strategy,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "providers": router.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    results = []
+    with contextlib.redirect_stdout(sys.stderr):
+        for strategy in ("single", "routed", "hedged"):
+            results.append(asyncio.run(run(strategy, args.requests, args.concurrency)))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
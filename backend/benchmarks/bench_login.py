@@ -0,0 +1,97 @@
+"""Login latency of the OAuth callback against local stand-ins.
+
+LinkedIn's token and userinfo endpoints are served by the fake LinkedIn
+server; the database is an InMemoryRepository with a simulated round trip.
+Measures how long the callback takes to return its redirect under:
+
+    select_then_write  lookup, then update or insert, before redirecting (the old flow)
+    upsert             one upsert, before redirecting
+    background_upsert  one upsert, after the redirect has been returned (the current flow)
+
+    cd backend && python benchmarks/bench_login.py --logins 200 --db-latency 0.03
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+PORT = int(os.getenv("BENCH_LINKEDIN_PORT", "8768"))
+os.environ["LINKEDIN_API_BASE"] = f"http://127.0.0.1:{PORT}"
+os.environ["LINKEDIN_OAUTH_BASE"] = f"http://127.0.0.1:{PORT}/oauth/v2"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from fastapi import BackgroundTasks  # noqa: E402
+import http_client  # noqa: E402
+from fake_linkedin import serve  # noqa: E402
+from oauth import linkedin_callback  # noqa: E402
+from repository import InMemoryRepository, set_repository  # noqa: E402
+
+
+class SelectThenWriteRepository(InMemoryRepository):
+    """The previous save_user: a lookup round trip, then an update or insert."""
+
+    async def save_user(self, linkedin_id: str, name: str, email: str, access_token: str) -> dict:
+        await self._round_trip("db_select")
+        return await super().save_user(linkedin_id, name, email, access_token)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(strategy: str, logins: int, concurrency: int, db_latency: float) -> dict:
+    repository_class = SelectThenWriteRepository if strategy == "select_then_write" else InMemoryRepository
+    repository = repository_class(latency=db_latency)
+    set_repository(repository)
+    await http_client.open_http_client()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login(i: int):
+        async with semaphore:
+            tasks = BackgroundTasks()
+            start = time.perf_counter()
+            response = await linkedin_callback(code=f"code-{i}", background_tasks=tasks)
+            if strategy != "background_upsert":
+                await tasks()
+            latencies.append(time.perf_counter() - start)
+            assert "error" not in response.headers["location"], response.headers["location"]
+            if strategy == "background_upsert":
+                await tasks()
+
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    await http_client.close_http_client()
+
+    return {
+        "strategy": strategy,
+        "logins": logins,
+        "users_stored": len(repository.users),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.03, help="simulated database round trip (s)")
+    parser.add_argument("--linkedin-latency", type=float, default=0.05, help="simulated LinkedIn round trip (s)")
+    args = parser.parse_args()
+
+    results = []
+    with serve(PORT, latency=args.linkedin_latency, handshake_latency=0.0):
+        for strategy in ("select_then_write", "upsert", "background_upsert"):
+            with contextlib.redirect_stdout(sys.stderr):
+                results.append(asyncio.run(run(strategy, args.logins, args.concurrency, args.db_latency)))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
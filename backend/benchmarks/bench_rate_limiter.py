@@ -0,0 +1,109 @@
+"""Throughput under LinkedIn throttling, with and without the client-side limiter.
+
+Runs a burst of publishes from many members at once against a local stand-in
+that enforces per-app and per-member quotas, and compares:
+
+    none      no limiter and no 429 handling (the old behaviour)
+    retry     no limiter, but 429s are retried after Retry-After
+    adaptive  token buckets per member and per app, adapted from 429s
+
+    cd backend && python benchmarks/bench_rate_limiter.py --members 20 --posts 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+PORT = int(os.getenv("BENCH_LINKEDIN_PORT", "8766"))
+os.environ["LINKEDIN_API_BASE"] = f"http://127.0.0.1:{PORT}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from fastapi import UploadFile  # noqa: E402
+import http_client  # noqa: E402
+import linkedin  # noqa: E402
+from fake_linkedin import serve  # noqa: E402
+from rate_limiter import LinkedInRateLimiter, set_rate_limiter  # noqa: E402
+from repository import InMemoryRepository, set_repository  # noqa: E402
+
+UNLIMITED = 1e9
+
+
+def limiter(strategy: str, app_rate: float, member_rate: float) -> LinkedInRateLimiter:
+    if strategy == "none":
+        return LinkedInRateLimiter(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, max_retries=0)
+    if strategy == "retry":
+        return LinkedInRateLimiter(UNLIMITED, UNLIMITED, UNLIMITED, UNLIMITED, max_retries=5)
+    return LinkedInRateLimiter(app_rate, app_rate, member_rate, member_rate, max_retries=5)
+
+
+async def run(strategy: str, members: int, posts: int, images: int, app_rate: float, member_rate: float) -> dict:
+    repository = InMemoryRepository()
+    for m in range(members):
+        await repository.save_user(f"member{m}", "Bench User", f"member{m}@example.com", f"token-{m}")
+    set_repository(repository)
+    rate_limiter = limiter(strategy, app_rate, member_rate)
+    set_rate_limiter(rate_limiter)
+    await http_client.open_http_client()
+
+    latencies, errors = [], []
+
+    async def publish(m: int, p: int):
+        files = [UploadFile(io.BytesIO(b"x" * 1024), size=1024, filename=f"{p}-{i}.png") for i in range(images)]
+        start = time.perf_counter()
+        result = await linkedin.post_to_linkedin(user_id=f"member{m}", text=f"post {p}", image_files=files or None)
+        if result.get("success"):
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(result["error"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(publish(m, p) for m in range(members) for p in range(posts)))
+    wall = time.perf_counter() - start
+    await http_client.close_http_client()
+
+    latencies.sort()
+    return {
+        "strategy": strategy,
+        "published": len(latencies),
+        "failed": len(errors),
+        "wall_s": round(wall, 2),
+        "posts_per_s": round(len(latencies) / wall, 2),
+        "p95_s": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+        "client_429s": rate_limiter.throttled,
+        "limiter": rate_limiter.stats()["app"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--posts", type=int, default=5, help="posts per member, all sent at once")
+    parser.add_argument("--images", type=int, default=1, help="images per post")
+    parser.add_argument("--app-quota", type=int, default=40, help="stand-in requests/s per app")
+    parser.add_argument("--member-quota", type=int, default=4, help="stand-in requests/s per member")
+    # Deliberately above the quota, so the limiter has to find the real rate from 429s
+    parser.add_argument("--app-rate", type=float, default=60)
+    parser.add_argument("--member-rate", type=float, default=6)
+    args = parser.parse_args()
+
+    results = []
+    with serve(PORT, latency=0.01, handshake_latency=0.0,
+               app_quota=args.app_quota, member_quota=args.member_quota) as server:
+        for strategy in ("none", "retry", "adaptive"):
+            server.reset()
+            with contextlib.redirect_stdout(sys.stderr):
+                result = asyncio.run(run(
+                    strategy, args.members, args.posts, args.images, args.app_rate, args.member_rate
+                ))
+            result["server_429s"] = server.stats()["throttled"]
+            results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
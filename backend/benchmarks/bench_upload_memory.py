@@ -0,0 +1,102 @@
+"""Peak memory of a multi-image publish through `/Post_to_linkedin/{post_id}`.
+
+Builds spooled uploads the way Starlette's multipart parser does (rolled over
+to disk past 1MB), calls the endpoint function directly and records the peak
+Python heap with tracemalloc while the images are validated, spooled by the
+publish queue and sent to a local LinkedIn stand-in.
+
+    cd backend && python benchmarks/bench_upload_memory.py --images 10 --size-mb 10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+PORT = int(os.getenv("BENCH_LINKEDIN_PORT", "8765"))
+os.environ["LINKEDIN_API_BASE"] = f"http://127.0.0.1:{PORT}"
+# The payload is random bytes, not images; measure the upload path only
+os.environ["IMAGE_PREPROCESS"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from fastapi import UploadFile  # noqa: E402
+from starlette.datastructures import Headers  # noqa: E402
+
+import main  # noqa: E402
+from fake_linkedin import serve  # noqa: E402
+from repository import InMemoryRepository, set_repository  # noqa: E402
+
+SPOOL_MAX_SIZE = 1024 * 1024  # Starlette's multipart spool threshold
+
+
+def make_uploads(count: int, size: int):
+    uploads = []
+    for i in range(count):
+        # Distinct content per image, so none is served from the asset cache
+        block = os.urandom(1024 * 1024)
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        remaining = size
+        while remaining:
+            piece = block[: min(remaining, len(block))]
+            spooled.write(piece)
+            remaining -= len(piece)
+        spooled.seek(0)
+        uploads.append(UploadFile(
+            spooled, size=size, filename=f"image{i}.jpg",
+            headers=Headers({"content-type": "image/jpeg"}),
+        ))
+    return uploads
+
+
+async def run(images: int, size: int):
+    repository = InMemoryRepository()
+    await repository.save_user("member", "Bench User", "bench@example.com", "bench-token")
+    post = await repository.insert_post({"user_id": "member", "generated_text": "hello"})
+    set_repository(repository)
+
+    uploads = make_uploads(images, size)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    with contextlib.redirect_stdout(sys.stderr):
+        queue = main.get_publish_queue()
+        await queue.start()
+        response = await main.upload_linkedin_post(
+            user_id="member", post_id=post["id"], files=uploads, text=None, idempotency_key=None
+        )
+        job_id = json.loads(response.body)["job_id"]
+        while repository.publish_jobs[job_id]["status"] not in ("succeeded", "failed"):
+            await asyncio.sleep(0.01)
+        await queue.stop()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for upload in uploads:
+        await upload.close()
+    return peak - baseline
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--size-mb", type=float, default=10)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    with serve(PORT, latency=0.005, handshake_latency=0) as fake:
+        peak = asyncio.run(run(args.images, size))
+        uploaded = fake.stats()["uploaded_bytes"]
+
+    print(json.dumps({
+        "images": args.images,
+        "payload_mb": round(args.images * size / 2**20, 1),
+        "uploaded_mb": round(uploaded / 2**20, 1),
+        "peak_heap_mb": round(peak / 2**20, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_()
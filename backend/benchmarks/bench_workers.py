@@ -0,0 +1,63 @@
+"""Throughput of the multi-worker server (app/server.py) from 1 to N workers.
+
+Boots the app with 1, 2, ... N worker processes against the same stand-ins
+as load_test.py, and drives create_post and auth_callback at a fixed
+concurrency. LLM and database latency default to zero, so requests cost app
+CPU rather than waiting, which is what more workers help with. Prints the
+throughput at each worker count and its speedup over one worker as JSON.
+
+The load generator runs in this process and needs CPU too, so on a machine
+with few cores it limits the scaling that can be measured.
+
+    cd backend && python benchmarks/bench_workers.py --max-workers 4 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_linkedin import serve  # noqa: E402
+from load_test import LINKEDIN_PORT, run_level, start_app  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--scenarios", default="create_post,auth_callback")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario and worker count")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--db-latency", type=float, default=0.0)
+    parser.add_argument("--llm-first-token", type=float, default=0.0)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--llm-token-interval", type=float, default=0.0)
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    results = []
+    with serve(LINKEDIN_PORT, latency=0.0, handshake_latency=0.0):
+        for workers in range(1, args.max_workers + 1):
+            args.workers = workers
+            app = start_app(args)
+            try:
+                for scenario in scenarios:
+                    result = asyncio.run(run_level(scenario, args.concurrency, args.requests, args.users))
+                    result["workers"] = workers
+                    print(json.dumps(result), file=sys.stderr)
+                    results.append(result)
+            finally:
+                app.terminate()
+                app.wait()
+
+    single = {r["scenario"]: r["throughput_rps"] for r in results if r["workers"] == 1}
+    for result in results:
+        result["speedup"] = round(result["throughput_rps"] / single[result["scenario"]], 2)
+    print(json.dumps({"cpus": os.cpu_count(), "config": {k: v for k, v in vars(args).items() if k != "workers"}, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Local stand-in for the LinkedIn REST and OAuth endpoints used by the backend.
+
+Runs a real uvicorn server (optionally over TLS with a throwaway self-signed
+certificate) in a separate process so the app's own HTTP client talks to it
+exactly as it would talk to api.linkedin.com, without sharing a GIL with the
+code being measured. Counters are read back through `/__stats`.
+
+Optional quotas (requests per second, per application and per member access
+token) are enforced over fixed one-second windows and answered with 429 and
+`Retry-After`, like LinkedIn's throttling.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+class FakeLinkedIn:
+    def __init__(
+        self,
+        latency: float = 0.02,
+        handshake_latency: float = 0.06,
+        app_quota: int = 0,
+        member_quota: int = 0,
+        upload_bandwidth: float = 0,
+        error_rate: float = 0.0
+    ):
+        # `latency` models one network round trip per request; `handshake_latency`
+        # models the extra TCP + TLS round trips paid once per new connection,
+        # which loopback otherwise hides. `upload_bandwidth` (bytes/s) models the
+        # client's uplink for image uploads. Zero quotas or bandwidth mean unlimited.
+        # `error_rate` is the fraction of API calls answered with a 500.
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.app_quota = app_quota
+        self.member_quota = member_quota
+        self.upload_bandwidth = upload_bandwidth
+        self.error_rate = error_rate
+        self.errors = 0
+        self._link_free_at = 0.0
+        self.connections = set()
+        self.requests = 0
+        self.throttled = 0
+        self.uploaded_bytes = 0
+        self._window = 0
+        self._window_counts: dict = {}
+        self.app = self._build_app()
+
+    def _over_quota(self, token: str) -> float:
+        """Count the request against the current window; seconds to wait if it is over quota."""
+        now = time.time()
+        window = math.floor(now)
+        if window != self._window:
+            self._window = window
+            self._window_counts = {}
+        app_count = self._window_counts.get(None, 0)
+        member_count = self._window_counts.get(token, 0)
+        if (self.app_quota and app_count >= self.app_quota) or (self.member_quota and member_count >= self.member_quota):
+            return window + 1 - now
+        self._window_counts[None] = app_count + 1
+        self._window_counts[token] = member_count + 1
+        return 0.0
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+        fake = self
+
+        @app.middleware("http")
+        async def track(request: Request, call_next):
+            # Each distinct client (host, port) pair is a separate TCP connection
+            peer = tuple(request.scope.get("client") or ())
+            delay = fake.latency
+            if peer not in fake.connections:
+                fake.connections.add(peer)
+                delay += fake.handshake_latency
+            fake.requests += 1
+            if delay:
+                await asyncio.sleep(delay)
+            if fake.error_rate and not request.url.path.startswith("/__") and random.random() < fake.error_rate:
+                fake.errors += 1
+                return JSONResponse({"message": "Internal Server Error", "status": 500}, status_code=500)
+            token = request.headers.get("authorization")
+            if token and not request.url.path.startswith("/__"):
+                retry_after = fake._over_quota(token)
+                if retry_after:
+                    fake.throttled += 1
+                    return JSONResponse(
+                        {"message": "Resource level throttle limit reached", "status": 429},
+                        status_code=429,
+                        headers={"Retry-After": str(math.ceil(retry_after))},
+                    )
+            return await call_next(request)
+
+        @app.get("/__stats")
+        async def stats():
+            return {
+                "tcp_connections": len(fake.connections),
+                "requests": fake.requests,
+                "throttled": fake.throttled,
+                "errors": fake.errors,
+                "uploaded_bytes": fake.uploaded_bytes,
+            }
+
+        @app.post("/__reset")
+        async def reset():
+            fake.reset()
+            return {}
+
+        @app.post("/v2/assets")
+        async def register_upload(request: Request):
+            asset = f"urn:li:digitalmediaAsset:{uuid.uuid4().hex}"
+            base = str(request.base_url).rstrip("/")
+            return {
+                "value": {
+                    "asset": asset,
+                    "uploadMechanism": {
+                        "com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {
+                            "uploadUrl": f"{base}/upload/{asset}"
+                        }
+                    },
+                }
+            }
+
+        @app.put("/upload/{asset}")
+        async def upload(asset: str, request: Request):
+            async for chunk in request.stream():
+                fake.uploaded_bytes += len(chunk)
+                if fake.upload_bandwidth:
+                    # All uploads share one link: each chunk waits for its slot on it
+                    now = time.monotonic()
+                    fake._link_free_at = max(now, fake._link_free_at) + len(chunk) / fake.upload_bandwidth
+                    await asyncio.sleep(fake._link_free_at - now)
+            return Response(status_code=201)
+
+        @app.post("/v2/ugcPosts")
+        async def ugc_posts():
+            return JSONResponse({"id": f"urn:li:share:{uuid.uuid4().int % 10**12}"}, status_code=201)
+
+        @app.post("/oauth/v2/accessToken")
+        async def access_token():
+            return {"access_token": f"token-{uuid.uuid4().hex}", "expires_in": 5184000}
+
+        @app.get("/v2/userinfo")
+        async def userinfo(request: Request):
+            token = request.headers.get("authorization", "")[-8:]
+            return {"sub": f"member-{token}", "name": "Bench User", "email": f"{token}@example.com"}
+
+        return app
+
+    def reset(self):
+        self.connections.clear()
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.uploaded_bytes = 0
+        self._window_counts = {}
+
+
+def _self_signed_cert(directory: str):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+class FakeLinkedInServer:
+    """Handle on a stand-in running in a child process."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._client = httpx.Client(base_url=base_url, verify=False)
+
+    def stats(self) -> dict:
+        # Fetched over a fresh connection, so subtract it from the count
+        stats = self._client.get("/__stats").json()
+        stats["tcp_connections"] -= 1
+        return stats
+
+    def reset(self):
+        self._client.post("/__reset")
+        self._client.close()
+        self._client = httpx.Client(base_url=self.base_url, verify=False)
+
+
+@contextmanager
+def serve(
+    port: int,
+    tls: bool = False,
+    latency: float = 0.02,
+    handshake_latency: float = 0.06,
+    app_quota: int = 0,
+    member_quota: int = 0,
+    upload_bandwidth: float = 0,
+    error_rate: float = 0.0
+):
+    """Run the stand-in on 127.0.0.1:`port` in a child process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        args = [
+            sys.executable, os.path.abspath(__file__), "--port", str(port),
+            "--latency", str(latency), "--handshake-latency", str(handshake_latency),
+            "--app-quota", str(app_quota), "--member-quota", str(member_quota),
+            "--upload-bandwidth", str(upload_bandwidth), "--error-rate", str(error_rate),
+        ]
+        if tls:
+            cert, key = _self_signed_cert(tmp)
+            args += ["--certfile", cert, "--keyfile", key]
+            # Let the app's verify=True client trust the throwaway certificate
+            os.environ["SSL_CERT_FILE"] = cert
+
+        base_url = f"{'https' if tls else 'http'}://127.0.0.1:{port}"
+        process = subprocess.Popen(args)
+        try:
+            deadline = time.monotonic() + 15
+            while True:
+                try:
+                    httpx.get(f"{base_url}/__stats", verify=False)
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+            server = FakeLinkedInServer(base_url)
+            server.reset()
+            yield server
+        finally:
+            process.kill()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--handshake-latency", type=float, default=0.06)
+    parser.add_argument("--app-quota", type=int, default=0, help="requests per second for the whole app (0 = unlimited)")
+    parser.add_argument("--member-quota", type=int, default=0, help="requests per second per access token (0 = unlimited)")
+    parser.add_argument("--upload-bandwidth", type=float, default=0, help="upload bytes/s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API calls failing with 500")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    fake = FakeLinkedIn(
+        latency=args.latency, handshake_latency=args.handshake_latency,
+        app_quota=args.app_quota, member_quota=args.member_quota,
+        upload_bandwidth=args.upload_bandwidth, error_rate=args.error_rate,
+    )
+    uvicorn.run(
+        fake.app, host="127.0.0.1", port=args.port, log_level="warning",
+        timeout_keep_alive=60, backlog=4096,
+        ssl_certfile=args.certfile, ssl_keyfile=args.keyfile,
+    )
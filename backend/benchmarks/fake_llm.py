@@ -0,0 +1,52 @@
+"""Scripted stand-in for a LangChain chat model.
+
+Each call takes the next entry of `script` as the time to the first token
+(`None` means the call fails), then streams `tokens` chunks `token_interval`
+seconds apart, or the whole response as one chunk if `tokens` is None.
+`ainvoke` waits for the whole response, like a real model.
+"""
+
+import asyncio
+import itertools
+from typing import Optional
+
+
+class _Message:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    def __init__(self, name: str, script, tokens: Optional[int] = None, token_interval: float = 0.0):
+        self.name = name
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self._script = itertools.cycle(script)
+
+    async def _first_token(self):
+        latency = next(self._script)
+        if latency is None:
+            await asyncio.sleep(0.05)
+            raise RuntimeError(f"{self.name} unavailable")
+        await asyncio.sleep(latency)
+
+    def _chunks(self, prompt):
+        text = f"{self.name}: {prompt}"
+        if self.tokens is None:
+            return [text]
+        words = text.split() or [""]
+        return [f"{words[i % len(words)]} " for i in range(self.tokens)]
+
+    async def ainvoke(self, prompt):
+        await self._first_token()
+        chunks = self._chunks(prompt)
+        if len(chunks) > 1 and self.token_interval:
+            await asyncio.sleep(self.token_interval * (len(chunks) - 1))
+        return _Message("".join(chunks).strip())
+
+    async def astream(self, prompt):
+        await self._first_token()
+        for i, chunk in enumerate(self._chunks(prompt)):
+            if i and self.token_interval:
+                await asyncio.sleep(self.token_interval)
+            yield _Message(chunk)
@@ -0,0 +1,257 @@
+"""End-to-end load test of the FastAPI app against local stand-ins.
+
+Boots `main.app` under uvicorn in a child process with:
+
+  - the fake LinkedIn server (fake_linkedin.py) for the REST and OAuth APIs,
+    with configurable latency and error rate
+  - an InMemoryRepository with a simulated round trip instead of Supabase
+  - a FakeChatModel with scripted first-token and per-token timing instead
+    of OpenAI
+
+then drives `/create_post/`, `/Post_to_linkedin/{post_id}` and
+`/auth/callback` from this process with closed-loop clients at each
+concurrency level, and prints throughput and p50/p95/p99 latency as JSON.
+
+    cd backend && python benchmarks/load_test.py --levels 1,8,32 --output baseline.json
+    cd backend && python benchmarks/load_test.py --levels 1,8,32 --baseline baseline.json
+
+With --baseline, each result also gets a `vs_baseline` entry comparing it to
+the same scenario and concurrency in the saved run.
+
+With --workers N the app runs under app/server.py with N worker processes.
+Each worker then has its own in-memory repository, so the publish scenario
+(which polls job status, possibly on another worker) only works with one.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+APP_PORT = int(os.getenv("BENCH_APP_PORT", "8790"))
+LINKEDIN_PORT = int(os.getenv("BENCH_LINKEDIN_PORT", "8791"))
+APP_URL = f"http://127.0.0.1:{APP_PORT}"
+SCENARIOS = ("create_post", "publish", "auth_callback")
+
+
+def serve_app(args) -> None:
+    """Child process: the real app wired to the stand-ins."""
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+    import uvicorn
+    from fake_llm import FakeChatModel
+    from llm_router import LLMRouter, Provider, set_router
+    from repository import InMemoryRepository, set_repository
+    import main
+    import server
+
+    def install_stand_ins(worker: int = 0) -> None:
+        # With several workers each one gets its own copy of the seeded repository
+        repository = InMemoryRepository(latency=args.db_latency)
+        for i in range(args.users):
+            repository.users[f"member{i}"] = {"id": str(uuid.uuid4()), "linkedin_id": f"member{i}", "access_token": f"token-{i}"}
+            repository._store_post({"id": f"post-{i}", "user_id": f"member{i}", "generated_text": f"Seeded post {i}"})
+        set_repository(repository)
+        set_router(LLMRouter([Provider("fake", FakeChatModel(
+            "fake", [args.llm_first_token], tokens=args.llm_tokens, token_interval=args.llm_token_interval
+        ))]))
+
+    if args.workers > 1:
+        server.serve(main.app, "127.0.0.1", APP_PORT, args.workers, on_worker_start=install_stand_ins)
+        return
+    install_stand_ins()
+    uvicorn.run(main.app, host="127.0.0.1", port=APP_PORT, log_level="warning")
+
+
+def start_app(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "LINKEDIN_API_BASE": f"http://127.0.0.1:{LINKEDIN_PORT}",
+        "LINKEDIN_OAUTH_BASE": f"http://127.0.0.1:{LINKEDIN_PORT}/oauth/v2",
+        "PUBLISH_SPOOL_DIR": os.path.join(tempfile.gettempdir(), f"linkfluence-load-{os.getpid()}"),
+        "IMAGE_PREPROCESS": "false",
+        "WEB_WORKERS": str(args.workers),
+    })
+    # Measure the app, not the client-side LinkedIn throttle, unless asked to
+    for name in ("LINKEDIN_APP_RATE", "LINKEDIN_APP_BURST", "LINKEDIN_MEMBER_RATE", "LINKEDIN_MEMBER_BURST"):
+        env.setdefault(name, "100000")
+
+    command = [
+        sys.executable, os.path.abspath(__file__), "--serve-app",
+        "--users", str(args.users), "--db-latency", str(args.db_latency),
+        "--llm-first-token", str(args.llm_first_token), "--llm-tokens", str(args.llm_tokens),
+        "--llm-token-interval", str(args.llm_token_interval), "--workers", str(args.workers),
+    ]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            httpx.get(f"{APP_URL}/health")
+            return process
+        except httpx.TransportError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("App did not start")
+            time.sleep(0.1)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def send(client: httpx.AsyncClient, scenario: str, i: int, users: int, tag: str, jobs: list) -> bool:
+    """One request; True if it got the expected response. Queued job ids go to `jobs`."""
+    member = i % users
+    if scenario == "create_post":
+        response = await client.get("/create_post/", params={
+            "user_id": f"member{member}",
+            # Unique text, so every request reaches the LLM instead of the cache
+            "text": f"Load test {tag} {i}",
+            "length": "short",
+            "note": "load test",
+        })
+        return response.status_code == 200
+    if scenario == "publish":
+        response = await client.post(
+            f"/Post_to_linkedin/post-{member}",
+            params={"user_id": f"member{member}"},
+            headers={"Idempotency-Key": f"{tag}-{i}"},
+        )
+        if response.status_code != 202:
+            return False
+        jobs.append(response.json()["job_id"])
+        return True
+    response = await client.get("/auth/callback", params={"code": f"{tag}-{i}"})
+    return response.status_code in (302, 307) and "error" not in response.headers.get("location", "")
+
+
+async def run_level(scenario: str, concurrency: int, requests: int, users: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=APP_URL, limits=limits, timeout=120, follow_redirects=False) as client:
+        tag = uuid.uuid4().hex[:8]
+        # Warm up connections and code paths outside the measurement
+        await asyncio.gather(*(send(client, scenario, i, users, f"warm-{tag}", []) for i in range(min(concurrency, 10))))
+
+        latencies, jobs, errors = [], [], 0
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index, errors
+            while next_index < requests:
+                i = next_index
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    ok = await send(client, scenario, i, users, tag, jobs)
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+        result = {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": requests,
+            "errors": errors,
+            "throughput_rps": round(requests / wall, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        }
+
+        if scenario == "publish":
+            # Publishing finishes in the background; time how long the queue takes to drain
+            drain_start = time.perf_counter()
+            pending, failed = set(jobs), 0
+            while pending:
+                for job_id in list(pending):
+                    status = (await client.get(f"/publish_jobs/{job_id}")).json()["status"]
+                    if status in ("succeeded", "failed"):
+                        pending.discard(job_id)
+                        failed += status == "failed"
+                await asyncio.sleep(0.05)
+            result["drain_s"] = round(time.perf_counter() - drain_start, 2)
+            result["jobs_failed"] = failed
+        return result
+
+
+def compare(results, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get((result["scenario"], result["concurrency"]))
+        if not before:
+            continue
+        result["vs_baseline"] = {
+            "throughput_ratio": round(result["throughput_rps"] / before["throughput_rps"], 3),
+            "p50_delta_ms": round(result["p50_ms"] - before["p50_ms"], 1),
+            "p95_delta_ms": round(result["p95_ms"] - before["p95_ms"], 1),
+            "p99_delta_ms": round(result["p99_ms"] - before["p99_ms"], 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve-app", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--levels", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--users", type=int, default=50, help="seeded members (and posts)")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="simulated database round trip (s)")
+    parser.add_argument("--linkedin-latency", type=float, default=0.03, help="simulated LinkedIn round trip (s)")
+    parser.add_argument("--linkedin-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="seconds to the first LLM token")
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--llm-token-interval", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=1, help="app worker processes (see app/server.py)")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args)
+        return
+
+    sys.path.insert(0, os.path.dirname(__file__))
+    from fake_linkedin import serve
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    levels = [int(level) for level in args.levels.split(",")]
+    results = []
+    with serve(LINKEDIN_PORT, latency=args.linkedin_latency, handshake_latency=0.0,
+               error_rate=args.linkedin_error_rate):
+        app = start_app(args)
+        try:
+            for scenario in scenarios:
+                for level in levels:
+                    result = asyncio.run(run_level(scenario, level, args.requests, args.users))
+                    print(json.dumps(result), file=sys.stderr)
+                    results.append(result)
+        finally:
+            # SIGTERM, so a multi-worker server stops its workers too
+            app.terminate()
+            app.wait()
+
+    if args.baseline:
+        compare(results, args.baseline)
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("serve_app", "output", "baseline")},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import asyncio
+import inspect
+import os
+import sys
+
+import pytest
+
+# The app modules import each other as top-level modules (see app/main.py);
+# the stand-ins in benchmarks/ are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import repository as repository_module  # noqa: E402
+from repository import InMemoryRepository, set_repository  # noqa: E402
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run `async def` tests in a fresh event loop."""
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        args = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        asyncio.run(pyfuncitem.obj(**args))
+        return True
+    return None
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self, now: float = 1_800_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def repository():
+    """An InMemoryRepository in place of Supabase for the duration of the test."""
+    previous = repository_module._repository
+    repository = InMemoryRepository()
+    set_repository(repository)
+    yield repository
+    set_repository(previous)
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def controller(clock, limit=1, max_queue=10, max_wait=5.0, deadline=60.0) -> AdmissionController:
+    return AdmissionController(limit, max_queue, max_wait, deadline, clock=clock)
+
+
+async def queued(ctrl: AdmissionController, count: int) -> list:
+    tasks = [asyncio.ensure_future(ctrl.acquire()) for _ in range(count)]
+    await asyncio.sleep(0)
+    assert ctrl.queued == count
+    return tasks
+
+
+async def test_release_hands_the_slot_to_the_next_in_line(clock):
+    ctrl = controller(clock)
+    await ctrl.acquire()
+    first, second = await queued(ctrl, 2)
+
+    ctrl.release()
+    await first
+    assert not second.done()
+    # The slot went straight to the waiter, it was never free
+    assert (ctrl.active, ctrl.queued) == (1, 1)
+
+    ctrl.release()
+    await second
+    ctrl.release()
+    assert (ctrl.active, ctrl.admitted) == (0, 3)
+
+
+async def test_rejects_when_the_queue_is_full(clock):
+    ctrl = controller(clock, max_queue=1)
+    await ctrl.acquire()
+    waiting, = await queued(ctrl, 1)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await ctrl.acquire()
+    assert rejected.value.reason == "queue_full"
+    assert ctrl.rejected["queue_full"] == 1
+
+    ctrl.release()
+    await waiting
+
+
+async def test_rejects_up_front_when_the_deadline_is_out_of_reach(clock):
+    ctrl = controller(clock, limit=2, max_wait=30.0, deadline=60.0)
+    await ctrl.acquire()
+    await ctrl.acquire()
+    ctrl.release(duration=50.0)
+    await ctrl.acquire()
+
+    # Expected wait is 25s for the first in line, plus 50s of generation: past the deadline
+    with pytest.raises(AdmissionRejected) as rejected:
+        await ctrl.acquire()
+    assert rejected.value.reason == "deadline"
+    assert rejected.value.retry_after == 25
+    assert ctrl.queued == 0
+
+
+async def test_gives_up_after_max_wait(clock):
+    ctrl = controller(clock, max_wait=0.01)
+    await ctrl.acquire()
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await ctrl.acquire()
+    assert rejected.value.reason == "timeout"
+    assert (ctrl.active, ctrl.queued) == (1, 0)
+
+
+async def test_cancelled_waiter_leaves_the_queue(clock):
+    ctrl = controller(clock)
+    await ctrl.acquire()
+    cancelled, waiting = await queued(ctrl, 2)
+
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    assert ctrl.queued == 1
+    assert ctrl.abandoned == 1
+
+    ctrl.release()
+    await waiting
+    assert ctrl.active == 1
+
+
+async def test_slot_handed_to_a_cancelled_waiter_passes_to_the_next(clock):
+    ctrl = controller(clock)
+    await ctrl.acquire()
+    cancelled, waiting = await queued(ctrl, 2)
+
+    # The slot is handed over, and the caller goes away before it resumes
+    ctrl.release()
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    await waiting
+
+    assert cancelled.cancelled()
+    assert (ctrl.active, ctrl.queued, ctrl.abandoned) == (1, 0, 1)
+    ctrl.release()
+    assert ctrl.active == 0
+
+
+async def test_slot_updates_the_service_time_estimate(clock):
+    ctrl = AdmissionController(1, 10, 5.0, 60.0, smoothing=0.5, clock=clock)
+    async with ctrl.slot():
+        clock.advance(4)
+    async with ctrl.slot():
+        clock.advance(2)
+    assert ctrl.service_time == 3.0
+
+    with pytest.raises(RuntimeError):
+        async with ctrl.slot():
+            clock.advance(100)
+            raise RuntimeError("generation failed")
+    # Failed generations don't count towards the estimate
+    assert ctrl.service_time == 3.0
+    assert ctrl.active == 0
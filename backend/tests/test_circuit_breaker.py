@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def breaker(clock, **options) -> CircuitBreaker:
+    settings = dict(error_rate=0.5, slow_call_rate=1.0, window=10, min_calls=4, open_for=30, half_open_calls=2)
+    return CircuitBreaker("test", slow_call=5.0, clock=clock, **{**settings, **options})
+
+
+async def ok():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+async def calls(b: CircuitBreaker, *fns) -> None:
+    for fn in fns:
+        try:
+            await b.call(fn)
+        except ConnectionError:
+            pass
+
+
+def opened(clock) -> CircuitBreaker:
+    b = breaker(clock)
+    for _ in range(4):
+        b.record(0.1, ok=False)
+    assert b.state == OPEN
+    return b
+
+
+async def test_opens_once_the_error_rate_is_reached(clock):
+    b = breaker(clock)
+    await calls(b, ok, fail, ok)
+    # Below min_calls nothing is decided yet
+    assert b.state == CLOSED
+
+    await calls(b, fail)
+    assert b.state == OPEN
+    with pytest.raises(CircuitOpenError) as rejected:
+        await b.call(ok)
+    assert rejected.value.retry_after == 30
+    assert b.rejected == 1
+
+
+async def test_slow_calls_count_against_the_breaker(clock):
+    b = breaker(clock, slow_call_rate=0.5)
+
+    async def slow():
+        clock.advance(6)
+        return "late"
+
+    await calls(b, ok, ok, slow, slow)
+    assert b.state == OPEN
+
+
+async def test_ignored_errors_count_as_successes(clock):
+    b = breaker(clock)
+    for _ in range(6):
+        with pytest.raises(ValueError):
+            await b.call(lambda: _raise(ValueError("bad request")), ignore_error=lambda e: isinstance(e, ValueError))
+    assert b.state == CLOSED
+    assert b.stats()["error_rate"] == 0.0
+
+
+async def test_failure_results_count_as_failures(clock):
+    b = breaker(clock)
+    for _ in range(4):
+        assert await b.call(lambda: _value(503), is_failure=lambda status: status >= 500) == 503
+    assert b.state == OPEN
+
+
+async def test_half_open_admits_a_limited_number_of_trials(clock):
+    b = opened(clock)
+    clock.advance(30)
+    assert b.state == HALF_OPEN
+
+    first, second = b.before_call(), b.before_call()
+    assert first and second
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+
+    b.record(0.1, ok=True, trial=True)
+    # One trial finished: another may start, but the breaker isn't closed yet
+    assert b.state == HALF_OPEN
+    assert b.before_call()
+    b.record(0.1, ok=True, trial=True)
+    assert b.state == CLOSED
+    b.record(0.1, ok=True, trial=True)
+    assert b.state == CLOSED
+
+
+async def test_failed_trial_opens_again(clock):
+    b = opened(clock)
+    clock.advance(30)
+    trial = b.before_call()
+    b.record(0.1, ok=False, trial=trial)
+    assert b.state == OPEN
+    assert b.opened == 2
+    assert b.retry_after() == 30
+
+
+async def test_slow_trial_opens_again(clock):
+    b = opened(clock)
+    clock.advance(30)
+    trial = b.before_call()
+    b.record(10.0, ok=True, trial=trial)
+    assert b.state == OPEN
+
+
+async def test_cancelled_trial_frees_its_place(clock):
+    b = opened(clock)
+    clock.advance(30)
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(60)
+
+    trials = [asyncio.ensure_future(b.call(hang)) for _ in range(2)]
+    await started.wait()
+    with pytest.raises(CircuitOpenError):
+        b.check()
+
+    for task in trials:
+        task.cancel()
+    await asyncio.gather(*trials, return_exceptions=True)
+    # Cancelled calls say nothing about the dependency: still half-open, with room for trials
+    assert b.state == HALF_OPEN
+    assert await b.call(ok) == "ok"
+    assert await b.call(ok) == "ok"
+    assert b.state == CLOSED
+
+
+async def test_calls_started_before_opening_dont_close_it(clock):
+    b = breaker(clock)
+    early = b.before_call()
+    for _ in range(4):
+        b.record(0.1, ok=False)
+    assert b.state == OPEN
+
+    b.record(0.1, ok=True, trial=early)
+    assert b.state == OPEN
+
+
+async def _raise(error: Exception):
+    raise error
+
+
+async def _value(value):
+    return value
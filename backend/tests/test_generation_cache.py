@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from generation_cache import GenerationCache
+from shared_state import MemoryState
+
+
+def cache(clock, maxsize=10, ttl=60.0) -> GenerationCache:
+    return GenerationCache(maxsize, ttl, timer=clock, state=MemoryState())
+
+
+class Producer:
+    """Counts calls; each one waits for `release` (if given) and returns the next number."""
+
+    def __init__(self, release: asyncio.Event = None):
+        self.release = release
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            if self.release is not None:
+                await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"text": f"result {self.calls}"}
+
+
+def test_keys_ignore_whitespace_and_argument_order():
+    assert GenerationCache.make_key(text="a  b\n", length="short") == GenerationCache.make_key(length="short", text="a b")
+    assert GenerationCache.make_key(text="a b") != GenerationCache.make_key(text="a c")
+
+
+async def test_second_call_is_a_hit(clock):
+    c, produce = cache(clock), Producer()
+    first = await c.get_or_generate("k", produce)
+    assert await c.get_or_generate("k", produce) == first
+    assert produce.calls == 1
+    assert (c.hits, c.misses) == (1, 1)
+
+
+async def test_concurrent_calls_share_one_generation(clock):
+    c, produce = cache(clock), Producer(asyncio.Event())
+    callers = [asyncio.ensure_future(c.get_or_generate("k", produce)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert c.stats()["in_flight"] == 1
+
+    produce.release.set()
+    results = await asyncio.gather(*callers)
+    assert produce.calls == 1
+    assert all(result == results[0] for result in results)
+    assert (c.misses, c.coalesced, c.stats()["in_flight"]) == (1, 4, 0)
+
+
+async def test_entries_expire_after_the_ttl(clock):
+    c, produce = cache(clock, ttl=60), Producer()
+    await c.get_or_generate("k", produce)
+    clock.advance(59)
+    await c.get_or_generate("k", produce)
+    assert produce.calls == 1
+
+    clock.advance(2)
+    assert await c.get_or_generate("k", produce) == {"text": "result 2"}
+
+
+async def test_least_recently_used_entry_is_evicted(clock):
+    c, produce = cache(clock, maxsize=2), Producer()
+    await c.get_or_generate("a", produce)
+    await c.get_or_generate("b", produce)
+    await c.get_or_generate("a", produce)
+    await c.get_or_generate("c", produce)
+    assert produce.calls == 3
+
+    await c.get_or_generate("a", produce)
+    assert produce.calls == 3
+    await c.get_or_generate("b", produce)
+    assert produce.calls == 4
+
+
+async def test_results_rejected_by_should_cache_are_not_kept(clock):
+    c, produce = cache(clock), Producer()
+    await c.get_or_generate("k", produce, should_cache=lambda result: False)
+    await c.get_or_generate("k", produce, should_cache=lambda result: False)
+    assert produce.calls == 2
+
+
+async def test_fresh_skips_the_cache_and_replaces_the_entry(clock):
+    c, produce = cache(clock), Producer()
+    await c.get_or_generate("k", produce)
+    fresh = await c.get_or_generate("k", produce, fresh=True)
+    assert fresh == {"text": "result 2"}
+    assert await c.get_or_generate("k", produce) == fresh
+
+
+async def test_a_cancelled_caller_doesnt_cancel_the_shared_generation(clock):
+    c, produce = cache(clock), Producer(asyncio.Event())
+    leaving = asyncio.ensure_future(c.get_or_generate("k", produce))
+    staying = asyncio.ensure_future(c.get_or_generate("k", produce))
+    await asyncio.sleep(0)
+
+    leaving.cancel()
+    await asyncio.gather(leaving, return_exceptions=True)
+    produce.release.set()
+
+    assert await staying == {"text": "result 1"}
+    assert produce.cancelled == 0
+    # And the result was cached for the next caller
+    assert await c.get_or_generate("k", produce) == {"text": "result 1"}
+
+
+async def test_the_generation_is_cancelled_when_every_caller_is(clock):
+    c, produce = cache(clock), Producer(asyncio.Event())
+    callers = [asyncio.ensure_future(c.get_or_generate("k", produce)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert produce.cancelled == 1
+    assert c.stats()["in_flight"] == 0
+
+
+async def test_errors_reach_every_caller_and_are_not_cached(clock):
+    c = cache(clock)
+    release = asyncio.Event()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        raise RuntimeError("provider down")
+
+    callers = [asyncio.ensure_future(c.get_or_generate("k", failing)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    with pytest.raises(RuntimeError):
+        await c.get_or_generate("k", failing)
+    assert calls == 2
+
+
+async def test_repeated_create_requests_return_the_stored_post(repository, clock, monkeypatch):
+    import Generate_post
+    import llm_router
+    from fake_llm import FakeChatModel
+
+    monkeypatch.setattr(Generate_post, "generation_cache", cache(clock))
+    router = llm_router.LLMRouter([llm_router.Provider("fake", FakeChatModel("fake", [0.01]), clock=clock)])
+    monkeypatch.setitem(llm_router._routers, "default", router)
+
+    def create(**options):
+        return Generate_post.generate_and_store_post("u1", "topic", "short", "note", **options)
+
+    double_click = await asyncio.gather(create(), create())
+    again = await create()
+    fresh = await create(fresh=True)
+
+    assert double_click[0]["post_id"] == double_click[1]["post_id"] == again["post_id"]
+    assert fresh["post_id"] != again["post_id"]
+    assert len(repository.posts) == 2
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from circuit_breaker import CircuitOpenError
+from fake_llm import FakeChatModel
+from llm_router import LLMRouter, Provider
+
+
+class RequestError(Exception):
+    """Like the openai/groq errors for a rejected request."""
+
+    status_code = 400
+
+
+class RejectingModel:
+    async def ainvoke(self, prompt):
+        raise RequestError("context length exceeded")
+
+
+class TrackingModel(FakeChatModel):
+    """A FakeChatModel that remembers whether a call was cancelled."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        try:
+            return await super().ainvoke(prompt)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+class BrokenStream(FakeChatModel):
+    """Streams a couple of chunks, then fails."""
+
+    async def astream(self, prompt):
+        async for chunk in super().astream(prompt):
+            yield chunk
+        raise RuntimeError(f"{self.name} dropped the stream")
+
+
+def provider(name, model, clock) -> Provider:
+    return Provider(name, model, clock=clock)
+
+
+async def test_ranks_by_latency_then_error_rate(clock):
+    fast, slow, untried, failing, open_ = (
+        provider(name, FakeChatModel(name, [0]), clock) for name in ("fast", "slow", "untried", "failing", "open")
+    )
+    for latency in (0.1, 0.2, 0.3):
+        fast.record(latency, ok=True)
+        slow.record(latency * 5, ok=True)
+    failing.record(0.1, ok=True)
+    failing.record(0.1, ok=False)
+    failing.record(0.1, ok=False)
+    for _ in range(open_.breaker.min_calls):
+        open_.breaker.record(0.1, ok=False)
+    router = LLMRouter([slow, failing, open_, fast, untried], max_error_rate=0.5, cooldown=10, clock=clock)
+
+    assert [p.name for p in router.ranked()] == ["untried", "fast", "slow", "failing"]
+
+    # A failing provider gets another chance once the cooldown has passed
+    clock.advance(10)
+    assert [p.name for p in router.ranked()] == ["untried", "failing", "fast", "slow"]
+
+
+async def test_falls_back_to_the_next_provider_on_failure(clock):
+    down = provider("down", FakeChatModel("down", [None]), clock)
+    up = provider("up", FakeChatModel("up", [0]), clock)
+    router = LLMRouter([down, up], clock=clock)
+
+    response = await router.ainvoke("hello")
+    assert response.content == "up: hello"
+    assert down.error_rate == 1.0
+    assert up.stats()["calls"] == 1
+
+
+async def test_fails_at_once_when_every_breaker_is_open(clock):
+    only = provider("only", FakeChatModel("only", [0]), clock)
+    for _ in range(only.breaker.min_calls):
+        only.breaker.record(0.1, ok=False)
+    router = LLMRouter([only], clock=clock)
+
+    with pytest.raises(CircuitOpenError):
+        await router.ainvoke("hello")
+
+
+async def test_hedges_after_hedge_after_and_cancels_the_loser(clock):
+    slow_model = TrackingModel("slow", [1.0])
+    fast_model = TrackingModel("fast", [0.01])
+    slow = provider("slow", slow_model, clock)
+    fast = provider("fast", fast_model, clock)
+    # Untried providers rank first, so give the slow one the better record
+    slow.record(0.1, ok=True)
+    fast.record(0.2, ok=True)
+    router = LLMRouter([slow, fast], hedge_after=0.05, clock=clock)
+
+    response = await router.ainvoke("hello")
+    await asyncio.sleep(0)
+
+    assert response.content == "fast: hello"
+    assert (slow_model.calls, fast_model.calls) == (1, 1)
+    assert slow_model.cancelled == 1
+    # The cancelled call says nothing about the slow provider's health
+    assert slow.stats()["calls"] == 1 and slow.error_rate == 0.0
+
+
+async def test_no_hedge_when_the_first_provider_answers_in_time(clock):
+    primary_model = TrackingModel("primary", [0])
+    backup_model = TrackingModel("backup", [0])
+    router = LLMRouter(
+        [provider("primary", primary_model, clock), provider("backup", backup_model, clock)],
+        hedge_after=0.5, clock=clock
+    )
+
+    response = await router.ainvoke("hello")
+    assert response.content == "primary: hello"
+    assert backup_model.calls == 0
+
+
+async def test_request_errors_dont_make_a_provider_unhealthy(clock):
+    rejecting = provider("rejecting", RejectingModel(), clock)
+    router = LLMRouter([rejecting], max_error_rate=0.5, clock=clock)
+
+    for _ in range(rejecting.breaker.min_calls + 1):
+        with pytest.raises(RequestError):
+            await router.ainvoke("far too long")
+
+    assert rejecting.error_rate == 0.0
+    assert router.is_healthy(rejecting)
+    assert rejecting.breaker.state == "closed"
+
+
+async def test_stream_falls_back_before_any_output(clock):
+    down = provider("down", FakeChatModel("down", [None], tokens=3), clock)
+    up = provider("up", FakeChatModel("up", [0], tokens=3), clock)
+    router = LLMRouter([down, up], clock=clock)
+
+    chunks = [chunk.content async for chunk in router.astream("hello")]
+    assert "".join(chunks).split() == ["up:", "hello", "up:"]
+    assert down.error_rate == 1.0
+
+
+async def test_stream_doesnt_fall_back_once_output_has_started(clock):
+    broken = provider("broken", BrokenStream("broken", [0], tokens=2), clock)
+    backup_model = TrackingModel("backup", [0], tokens=2)
+    router = LLMRouter([broken, provider("backup", backup_model, clock)], clock=clock)
+
+    chunks = []
+    with pytest.raises(RuntimeError, match="dropped the stream"):
+        async for chunk in router.astream("hello"):
+            chunks.append(chunk.content)
+
+    assert chunks == ["broken: ", "hello "]
+    assert broken.error_rate == 1.0
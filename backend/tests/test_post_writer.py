@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+from postgrest.exceptions import APIError
+
+import post_writer
+from post_writer import PostWriteError, PostWriter, PostWriteTimeout
+
+
+@pytest.fixture
+def writer(monkeypatch) -> PostWriter:
+    writer = PostWriter(max_batch=3, flush_interval=0.01, max_pending=100, max_attempts=3, wait_timeout=1.0)
+    monkeypatch.setattr(post_writer, "_post_writer", writer)
+    return writer
+
+
+def row(user_id: str = "u1", text: str = "hello") -> dict:
+    return {"user_id": user_id, "generated_text": text}
+
+
+async def test_rows_are_readable_right_after_add(repository, writer):
+    await writer.start()
+    stored = await writer.add(row())
+    assert stored["id"] not in repository.posts
+
+    post = await post_writer.get_post(stored["id"], "user_id, generated_text")
+    assert post == {"user_id": "u1", "generated_text": "hello"}
+    await writer.stop()
+
+
+async def test_rows_are_inserted_in_batches(repository, writer):
+    await writer.start()
+    rows = await writer.add_many([row(text=str(i)) for i in range(7)])
+    await asyncio.gather(*(writer.flushed(r["id"]) for r in rows))
+    await writer.stop()
+
+    assert len(repository.posts) == 7
+    assert (writer.rows, writer.batches) == (7, 3)
+
+
+async def test_list_posts_waits_for_the_users_rows(repository, writer):
+    await writer.start()
+    await writer.add_many([row(text="a"), row(user_id="u2"), row(text="b")])
+    posts = await post_writer.list_posts("u1", "generated_text", limit=10)
+    assert sorted(p["generated_text"] for p in posts) == ["a", "b"]
+    await writer.stop()
+
+
+async def test_stop_flushes_buffered_rows(repository, writer):
+    writer.flush_interval = 60
+    await writer.start()
+    await writer.add(row())
+    await writer.stop()
+    assert len(repository.posts) == 1
+
+
+async def test_rows_are_written_straight_away_when_not_running(repository, writer):
+    stored = await writer.add(row())
+    assert stored["id"] in repository.posts
+
+
+async def test_a_rejected_row_fails_alone(repository, writer, monkeypatch):
+    insert_posts = repository.insert_posts
+
+    async def check_users(rows):
+        if any(r["user_id"] == "ghost" for r in rows):
+            raise APIError({"message": "violates foreign key constraint", "code": "23503"})
+        return await insert_posts(rows)
+
+    monkeypatch.setattr(repository, "insert_posts", check_users)
+    await writer.start()
+    good, bad, other = await writer.add_many([row(), row(user_id="ghost"), row(text="other")])
+    bad_written = writer._written[bad["id"]]
+
+    assert await post_writer.get_post(bad["id"]) is None
+    with pytest.raises(PostWriteError):
+        await bad_written
+    assert await post_writer.get_post(good["id"]) is not None
+    assert await post_writer.get_post(other["id"]) is not None
+    assert (writer.rejected, writer.failures, writer.buffered) == (1, 0, 0)
+    await writer.stop()
+
+
+async def test_transient_errors_are_retried(repository, writer, monkeypatch):
+    insert_posts = repository.insert_posts
+    attempts = []
+
+    async def flaky(rows):
+        attempts.append(rows)
+        if len(attempts) == 1:
+            raise ConnectionError("connection reset")
+        return await insert_posts(rows)
+
+    monkeypatch.setattr(repository, "insert_posts", flaky)
+    await writer.start()
+    stored = await writer.add(row())
+    assert await post_writer.get_post(stored["id"]) is not None
+    assert (len(attempts), writer.failures, writer.lost) == (2, 1, 0)
+    await writer.stop()
+
+
+async def test_rows_are_dropped_after_max_attempts(repository, writer, monkeypatch):
+    async def down(rows):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(repository, "insert_posts", down)
+    await writer.start()
+    stored = await writer.add(row())
+
+    with pytest.raises(PostWriteError):
+        await writer.flushed(stored["id"])
+    assert (writer.failures, writer.lost, writer.buffered) == (3, 1, 0)
+    # Nothing is left to wait for, so reads don't hang
+    assert await post_writer.list_posts("u1", "id", limit=10) == []
+    await writer.stop()
+
+
+async def test_reads_time_out_while_the_write_is_slow(repository, writer, monkeypatch):
+    insert_posts = repository.insert_posts
+    release = asyncio.Event()
+
+    async def slow(rows):
+        await release.wait()
+        return await insert_posts(rows)
+
+    monkeypatch.setattr(repository, "insert_posts", slow)
+    writer.wait_timeout = 0.05
+    await writer.start()
+    stored = await writer.add(row())
+
+    with pytest.raises(PostWriteTimeout) as timeout:
+        await post_writer.get_post(stored["id"])
+    assert timeout.value.retry_after >= 1
+
+    release.set()
+    await writer.stop()
+    assert stored["id"] in repository.posts
+
+
+async def test_adds_wait_for_room_when_the_buffer_is_full(repository, writer, monkeypatch):
+    insert_posts = repository.insert_posts
+    release = asyncio.Event()
+
+    async def slow(rows):
+        await release.wait()
+        return await insert_posts(rows)
+
+    monkeypatch.setattr(repository, "insert_posts", slow)
+    writer.max_pending = 2
+    await writer.start()
+    await writer.add_many([row(), row()])
+
+    third = asyncio.ensure_future(writer.add(row()))
+    await asyncio.sleep(0.05)
+    assert not third.done()
+
+    release.set()
+    await third
+    await writer.stop()
+    assert len(repository.posts) == 3
+
+
+def test_publish_answers_503_while_the_post_is_being_written(repository, writer, monkeypatch):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    async def still_writing(post_id: str) -> None:
+        raise PostWriteTimeout(3)
+
+    monkeypatch.setattr(writer, "flushed", still_writing)
+    response = TestClient(app).post("/Post_to_linkedin/some-post?user_id=u1", data={"text": "hello"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
@@ -0,0 +1,158 @@
+import asyncio
+import types
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+import rate_limiter
+from rate_limiter import LinkedInRateLimiter, RateLimitedError, TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def sleeps(clock, monkeypatch) -> list:
+    """Make the limiter's sleeps move the fake clock instead of waiting. Returns the delays slept."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(round(delay, 6))
+        clock.advance(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(rate_limiter, "asyncio", types.SimpleNamespace(Lock=asyncio.Lock, sleep=sleep))
+    return delays
+
+
+def linkedin(*responses) -> httpx.AsyncClient:
+    """A client whose requests get `responses` (status, headers) in turn from a fake LinkedIn."""
+    script = iter(responses)
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("authorization"))
+        status, headers = next(script)
+        return httpx.Response(status, headers=headers, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="https://api.linkedin.test")
+    client.seen = seen
+    return client
+
+
+def limiter(clock, **options) -> LinkedInRateLimiter:
+    settings = dict(app_rate=100, app_burst=100, member_rate=1, member_burst=2, max_retries=3)
+    return LinkedInRateLimiter(clock=clock, **{**settings, **options})
+
+
+async def test_bucket_spends_the_burst_then_waits_for_refills(clock, sleeps):
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() == 0.5
+    assert sleeps == [0.5]
+
+
+async def test_throttling_cuts_the_rate_once_per_second(clock):
+    bucket = TokenBucket(rate=10, capacity=10, decrease=0.5, clock=clock)
+    bucket.on_throttled()
+    bucket.on_throttled()
+    assert bucket.rate == 5
+
+    clock.advance(1)
+    bucket.on_throttled()
+    assert bucket.rate == 2.5
+
+    for _ in range(10):
+        clock.advance(1)
+        bucket.on_throttled()
+    assert bucket.rate == bucket.min_rate == 0.5
+
+
+async def test_successes_raise_the_rate_back_additively(clock):
+    bucket = TokenBucket(rate=10, capacity=10, increase=0.1, decrease=0.5, clock=clock)
+    bucket.on_success()
+    bucket.on_throttled()
+    assert bucket.rate == 5
+
+    clock.advance(2)
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(7)
+
+    clock.advance(10)
+    bucket.on_success()
+    assert bucket.rate == 10
+
+
+async def test_retry_after_pauses_the_bucket_without_a_burst_after(clock, sleeps):
+    bucket = TokenBucket(rate=1, capacity=5, clock=clock)
+    bucket.on_throttled(retry_after=3)
+    assert bucket.stats()["paused_for"] == 3
+
+    assert await bucket.acquire() == 3
+    assert sleeps == [3]
+    # The saved-up burst was dropped: only what refilled during the pause, at the lowered rate, is left
+    assert bucket.tokens == pytest.approx(3 * 0.7 - 1)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after(None, default=2) == 2
+    assert parse_retry_after("soon", default=2) == 2
+    in_a_minute = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 < parse_retry_after(in_a_minute) <= 60
+
+
+async def test_429_is_retried_after_retry_after(clock, sleeps):
+    limits = limiter(clock)
+    client = linkedin((429, {"Retry-After": "3"}), (200, {}))
+    rates = []
+
+    def send():
+        rates.append((limits.member("token-a").rate, limits.app.rate))
+        return client.get("/v2/me", headers={"Authorization": "token-a"})
+
+    response = await limits.request("token-a", send)
+
+    assert response.status_code == 200
+    assert client.seen == ["token-a", "token-a"]
+    assert sleeps == [3]
+    assert (limits.requests, limits.throttled) == (2, 1)
+    # The retry went out at lowered rates; only the member bucket was paused for Retry-After
+    assert rates == [(1, 100), (pytest.approx(0.7), pytest.approx(70))]
+    # and the success starts raising them again
+    assert limits.member("token-a").rate > 0.7
+
+
+async def test_gives_up_after_max_retries(clock, sleeps):
+    limits = limiter(clock, max_retries=2)
+    client = linkedin(*[(429, {})] * 3)
+
+    with pytest.raises(RateLimitedError):
+        await limits.request("token-a", lambda: client.get("/v2/me"))
+    assert len(client.seen) == 3
+    # Without Retry-After the pauses back off exponentially
+    assert 1.0 in sleeps and 2.0 in sleeps
+
+
+async def test_members_have_their_own_buckets(clock, sleeps):
+    limits = limiter(clock, member_rate=1, member_burst=1)
+    client = linkedin(*[(200, {})] * 3)
+
+    await limits.request("token-a", lambda: client.get("/v2/me"))
+    await limits.request("token-b", lambda: client.get("/v2/me"))
+    assert sleeps == []
+    assert limits.member("token-a") is limits.member("token-a")
+    assert limits.member("token-a") is not limits.member("token-b")
+
+    await limits.request("token-a", lambda: client.get("/v2/me"))
+    assert sleeps == [1.0]
+
+
+async def test_the_app_bucket_limits_every_member(clock, sleeps):
+    limits = limiter(clock, app_rate=1, app_burst=1, member_rate=100, member_burst=100)
+    client = linkedin(*[(200, {})] * 2)
+
+    await limits.request("token-a", lambda: client.get("/v2/me"))
+    await limits.request("token-b", lambda: client.get("/v2/me"))
+    assert sleeps == [1.0]
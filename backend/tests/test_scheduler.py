@@ -0,0 +1,136 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import publish_queue
+from publish_queue import PublishQueue
+from scheduler import PostScheduler, to_iso
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # No workers: enqueued jobs just stay queued, so nothing calls LinkedIn
+    queue = PublishQueue(workers=0, spool_dir=str(tmp_path))
+    monkeypatch.setattr(publish_queue, "_publish_queue", queue)
+    return queue
+
+
+def schedule_post(repository, due: float) -> str:
+    return repository._store_post({"user_id": "u1", "generated_text": "hello", "scheduled_at": to_iso(due)})["id"]
+
+
+def at(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def published(repository) -> list:
+    return [job["post_id"] for job in repository.publish_jobs.values()]
+
+
+async def run_until_idle(scheduler: PostScheduler, clock) -> int:
+    # As the loop does: it runs again at once while the next wakeup is already due
+    total = 0
+    while True:
+        total += await scheduler.run_due()
+        if scheduler.next_wakeup() > clock():
+            return total
+
+
+async def test_dispatches_due_posts_in_order(repository, queue, clock):
+    await queue.start(resume=False)
+    later = schedule_post(repository, clock() + 20)
+    sooner = schedule_post(repository, clock() + 10)
+    scheduler = PostScheduler(horizon=300, clock=clock)
+
+    assert await scheduler.run_due() == 0
+    assert scheduler.next_wakeup() == clock() + 10
+
+    clock.advance(25)
+    assert await scheduler.run_due() == 2
+    assert published(repository) == [sooner, later]
+    assert repository.posts[sooner]["scheduled_at"] is None
+
+
+async def test_full_page_reloads_the_rest_of_the_window(repository, queue, clock):
+    await queue.start(resume=False)
+    due = [schedule_post(repository, clock() + offset) for offset in (10, 20, 30)]
+    beyond = schedule_post(repository, clock() + 400)
+    scheduler = PostScheduler(horizon=300, load_limit=2, clock=clock)
+
+    await scheduler.run_due()
+    # Only two posts fit in the page, so the window stops at the second one
+    assert scheduler.stats()["pending"] == 2
+    assert scheduler._loaded_until == clock() + 20
+
+    clock.advance(35)
+    assert await run_until_idle(scheduler, clock) == 3
+    assert published(repository) == due
+    assert repository.posts[beyond]["scheduled_at"] is not None
+
+
+async def test_rescheduled_and_cancelled_posts_leave_stale_entries(repository, queue, clock):
+    await queue.start(resume=False)
+    scheduler = PostScheduler(horizon=300, clock=clock)
+    await scheduler.run_due()
+    moved = schedule_post(repository, clock() + 100)
+    cancelled = schedule_post(repository, clock() + 100)
+
+    await scheduler.schedule(moved, at(clock() + 10))
+    await scheduler.schedule(moved, at(clock() + 50))
+    await scheduler.schedule(cancelled, at(clock() + 20))
+    await scheduler.unschedule(cancelled)
+
+    clock.advance(25)
+    # The entries for +10 and +20 are stale and are dropped without a dispatch
+    assert await scheduler.run_due() == 0
+    assert published(repository) == []
+    assert scheduler.stats()["heap_size"] == 1
+
+    clock.advance(25)
+    assert await scheduler.run_due() == 1
+    assert published(repository) == [moved]
+    stats = scheduler.stats()
+    assert (stats["pending"], stats["heap_size"], stats["dispatched"]) == (0, 0, 1)
+
+
+async def test_refresh_picks_up_posts_moved_by_another_worker(repository, queue, clock):
+    await queue.start(resume=False)
+    post = schedule_post(repository, clock() + 200)
+    scheduler = PostScheduler(horizon=300, refresh=30, clock=clock)
+    await scheduler.run_due()
+
+    # Moved earlier straight in the database, as another worker would
+    repository.posts[post]["scheduled_at"] = to_iso(clock() + 40)
+    clock.advance(30)
+    assert scheduler.next_wakeup() == clock()
+    await scheduler.run_due()
+
+    clock.advance(10)
+    assert await run_until_idle(scheduler, clock) == 1
+    assert published(repository) == [post]
+
+
+async def test_failed_dispatch_is_retried(repository, queue, clock, monkeypatch):
+    await queue.start(resume=False)
+    post = schedule_post(repository, clock() + 10)
+    scheduler = PostScheduler(horizon=300, retry_delay=30, clock=clock)
+    await scheduler.run_due()
+
+    enqueue = queue.enqueue
+    calls = []
+
+    async def flaky_enqueue(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise ConnectionError("database unreachable")
+        return await enqueue(**kwargs)
+
+    monkeypatch.setattr(queue, "enqueue", flaky_enqueue)
+    clock.advance(10)
+    assert await scheduler.run_due() == 0
+    assert scheduler.failed == 1
+    assert scheduler.next_wakeup() == clock() + 30
+
+    clock.advance(30)
+    assert await scheduler.run_due() == 1
+    assert published(repository) == [post]
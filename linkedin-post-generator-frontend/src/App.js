@@ -37,7 +37,19 @@ const GeneratedPostPage = () => {
         method: 'POST',
         body: formDataObj,
       });
-      if (response.ok) {
+      // Publishing runs in the background; poll the job until it finishes, for up to 2 minutes
+      let job = response.ok ? await response.json() : null;
+      const deadline = Date.now() + 2 * 60 * 1000;
+      while (job && job.status !== 'succeeded' && job.status !== 'failed') {
+        if (Date.now() > deadline) {
+          console.error('Publishing is taking too long; check LinkedIn before trying again');
+          break;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const statusResponse = await fetch(`${API_BASE_URL}/publish_jobs/${job.job_id}`);
+        job = statusResponse.ok ? { job_id: job.job_id, ...(await statusResponse.json()) } : null;
+      }
+      if (job && job.status === 'succeeded') {
         setPostPublished(true);
         setShowSuccess(true);
         setTimeout(() => {